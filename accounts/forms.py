@@ -4,6 +4,8 @@ User authentication forms.
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.utils import timezone
+from forum import avatars
 from forum.models import UserProfile
 
 
@@ -70,3 +72,23 @@ class ProfileForm(forms.ModelForm):
                 'placeholder': 'Votre signature (max 250 caractères)'
             }),
         }
+
+    def clean_avatar(self):
+        avatar = self.cleaned_data.get('avatar')
+        # Only new uploads; the stored file was checked already
+        if avatar and 'avatar' in self.changed_data:
+            avatars.validate_avatar(avatar)
+        return avatar
+
+    def save(self, commit=True):
+        profile = super().save(commit=False)
+        if 'avatar' in self.changed_data:
+            # Thumbnails are generated in the background from the new file
+            profile.avatar_version = ''
+            profile.avatar_uploaded_at = timezone.now()
+            if not profile.avatar:
+                avatars.prune(profile.user_id)
+        if commit:
+            profile.save()
+            self.save_m2m()
+        return profile
@@ -6,6 +6,7 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from forum import metrics
 from .forms import RegisterForm, ProfileForm
 
 
@@ -39,10 +40,12 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
+            metrics.logins.inc(result='success')
             login(request, user)
             next_url = request.GET.get('next', 'forum:index')
             return redirect(next_url)
         else:
+            metrics.logins.inc(result='failure')
             messages.error(request, "Nom d'utilisateur ou mot de passe incorrect.")
 
     return render(request, 'accounts/login.html')
@@ -0,0 +1,14 @@
+"""
+ASGI config for modern forum project.
+
+Serves the async versions of the read-only forum views, e.g.
+``uvicorn config.asgi:application --workers 4``.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('FORUM_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
@@ -4,6 +4,8 @@ Django settings for modern forum project.
 from pathlib import Path
 import os
 
+from decouple import Csv, config
+
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -36,12 +38,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'forum.middleware.StaticFilesMiddleware',  # no-op unless FORUM_STATIC_SERVE
+    'forum.middleware.MetricsMiddleware',  # no-op unless FORUM_METRICS
+    'forum.middleware.ProfilingMiddleware',  # no-op unless FORUM_PROFILING
+    'forum.middleware.ReplicaPinMiddleware',  # no-op unless FORUM_REPLICAS
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'forum.middleware.RateLimitMiddleware',  # no-op unless FORUM_RATE_LIMITS
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -64,12 +71,87 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Serve the read-only forum views as async views (set by config/asgi.py)
+FORUM_ASYNC_VIEWS = config('FORUM_ASYNC_VIEWS', default=False, cast=bool)
 
 # Database
-DATABASES = {
+# Read from the environment or a .env file (see .env.example): SQLite by
+# default, PostgreSQL with DB_ENGINE=postgresql.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+# Persistent connections are not reused across requests under ASGI
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=0 if FORUM_ASYNC_VIEWS else 60, cast=int)
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='forum'),
+            'USER': config('DB_USER', default='forum'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Persistent connections, checked before reuse
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Behind PgBouncer in transaction mode, server-side cursors break
+            'DISABLE_SERVER_SIDE_CURSORS': config('DB_PGBOUNCER', default=False, cast=bool),
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Read replicas: DB_REPLICAS lists one file (SQLite) or host (PostgreSQL)
+# per replica, DB_REPLICA_WEIGHTS their relative share of reads. Locally,
+# sync_replica copies the SQLite primary to its replica files.
+FORUM_REPLICAS = {}
+_replica_weights = config('DB_REPLICA_WEIGHTS', default='', cast=Csv(int))
+for _i, _replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), 1):
+    _alias = f'replica{_i}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': _replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+    FORUM_REPLICAS[_alias] = _replica_weights[_i - 1] if _i <= len(_replica_weights) else 1
+
+DATABASE_ROUTERS = ['forum.routers.ReplicaRouter']
+FORUM_REPLICA_APPS = ('forum', 'accounts')
+# 'weighted' (random by weight) or 'round_robin'
+FORUM_REPLICA_SELECTION = config('DB_REPLICA_SELECTION', default='weighted')
+# How long a user's reads stay on the primary after they write
+FORUM_REPLICA_PIN_SECONDS = 10
+
+# Pragmas applied to every new SQLite connection (forum/db.py): WAL lets
+# readers proceed while a write is in progress, NORMAL sync is safe with WAL
+FORUM_SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-16000, cast=int),
+    'temp_store': 'memory',
+    'foreign_keys': 'on',
+}
+
+# Cache
+# Any shared backend (Redis, Memcached) works too; template fragments use
+# the 'template_fragments' alias when it is defined, 'default' otherwise.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'forum',
     }
 }
 
@@ -99,6 +181,15 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic writes content-hashed names with .gz/.br copies (forum/staticfiles.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'forum.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Serve STATIC_ROOT from StaticFilesMiddleware; hashed names are cached for
+# a year, others for FORUM_STATIC_MAX_AGE seconds
+FORUM_STATIC_SERVE = config('FORUM_STATIC_SERVE', default=not DEBUG, cast=bool)
+FORUM_STATIC_MAX_AGE = 60
 
 # Media files
 MEDIA_URL = '/media/'
@@ -116,5 +207,79 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'forum:index'
 LOGOUT_REDIRECT_URL = 'forum:index'
 
+# Forum
+# Seconds between flushes of buffered topic view counts (0 writes through)
+FORUM_VIEW_FLUSH_INTERVAL = 10
+# Seconds after which the signal-maintained site totals are recounted
+FORUM_STATS_RECONCILE_INTERVAL = 3600
+# Upper bound on the lifetime of cached listing fragments, which are
+# otherwise invalidated by version bumps; keeps "il y a 5 minutes" honest
+FORUM_FRAGMENT_CACHE_TIMEOUT = 300
+# Lifetime of whole pages cached for anonymous readers
+FORUM_PAGE_CACHE_TIMEOUT = 300
+# Posts per topic page
+FORUM_POSTS_PER_PAGE = 15
+
+# Unread tracking: topics remembered per member and forum beyond the
+# "mark all read" watermark, and lifetime of the cached unread counts
+FORUM_READ_MARKERS = 100
+FORUM_UNREAD_CACHE_TIMEOUT = 3600
+
+# Seconds between checks of the shared routing version (forum/routing.py),
+# and age at which a process rebuilds its snapshot whatever the version
+FORUM_ROUTING_CHECK_INTERVAL = 1.0
+FORUM_ROUTING_MAX_AGE = 60
+
+# Live topic updates (server-sent events). The in-process broker only
+# reaches readers connected to the same worker process.
+FORUM_LIVE_BROKER = 'forum.live.InProcessBroker'
+FORUM_LIVE_HEARTBEAT = 15  # seconds between keep-alive comments
+FORUM_LIVE_RETRY_MS = 3000  # browser reconnect delay under ASGI
+FORUM_LIVE_POLL_MS = 10000  # polling interval under WSGI
+FORUM_LIVE_REPLAY_LIMIT = 50  # posts replayed on reconnect
+
+# Background jobs, run by `manage.py run_jobs`. Eager mode, the default
+# with DEBUG, runs them in the request instead, for development without a
+# worker. Production needs the run_jobs worker running, or avatar,
+# post rendering and search indexing jobs just pile up.
+FORUM_JOBS_EAGER = config('FORUM_JOBS_EAGER', default=DEBUG, cast=bool)
+FORUM_JOBS_MAX_ATTEMPTS = 5
+FORUM_JOBS_BACKOFF = 10  # seconds before the first retry, doubled each time
+FORUM_JOBS_MAX_BACKOFF = 3600
+FORUM_JOBS_TIMEOUT = 300  # a running job older than this is retried
+
+# Avatars: square thumbnail sizes (px), generated in WebP and JPEG
+FORUM_AVATAR_SIZES = (48, 96, 256)
+FORUM_AVATAR_MAX_SIZE = 1024  # cleaned upload kept for regeneration
+FORUM_AVATAR_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+FORUM_AVATAR_MAX_PIXELS = 25_000_000
+
+# Rate limits per URL name: (key, rate, methods), key being 'ip', 'user'
+# or 'post:<field>'. Counters are per process unless the backend is
+# 'forum.ratelimit.CacheBackend' on a shared cache (Redis, Memcached).
+FORUM_RATE_LIMITS = {
+    'accounts:login': [('ip', '20/10m', 'POST'), ('post:username', '5/5m', 'POST')],
+    'accounts:register': [('ip', '5/h', 'POST')],
+    'forum:search': [('ip', '30/m', 'GET'), ('user', '60/m', 'GET')],
+    'forum:create_topic': [('user', '5/10m', 'POST'), ('ip', '10/10m', 'POST')],
+    'forum:create_post': [('user', '10/m', 'POST'), ('ip', '30/m', 'POST')],
+}
+FORUM_RATE_LIMIT_BACKEND = config('FORUM_RATE_LIMIT_BACKEND', default='forum.ratelimit.LocalBackend')
+FORUM_RATE_LIMIT_CACHE = 'default'
+# Header carrying the client address behind a reverse proxy (e.g. 'X-Forwarded-For')
+FORUM_RATE_LIMIT_IP_HEADER = config('FORUM_RATE_LIMIT_IP_HEADER', default=None)
+
+# Request profiling (Server-Timing header, slow-request log, cProfile dumps)
+FORUM_PROFILING = False
+FORUM_SLOW_REQUEST_MS = 500
+FORUM_PROFILING_SAMPLE_RATE = 0.0
+FORUM_PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Prometheus metrics at /metrics; set FORUM_METRICS_DIR when running
+# several worker processes so their metrics are aggregated
+FORUM_METRICS = False
+FORUM_METRICS_DIR = None
+FORUM_METRICS_FLUSH_INTERVAL = 1.0
+
 # Custom user model (optional, for future expansion)
 # AUTH_USER_MODEL = 'accounts.CustomUser'
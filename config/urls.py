@@ -5,12 +5,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from forum.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', include('forum.urls')),
+    # Before the forum, whose <category>/<forum>/ pattern would shadow them
     path('accounts/', include('accounts.urls')),
     path('markdownx/', include('markdownx.urls')),
+    path('', include('forum.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
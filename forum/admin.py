@@ -2,7 +2,7 @@
 Admin configuration for forum models.
 """
 from django.contrib import admin
-from .models import Category, Forum, Topic, Post, UserProfile
+from .models import Category, Forum, Topic, Post, UserProfile, SiteStats, Job
 
 
 @admin.register(Category)
@@ -15,11 +15,12 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Forum)
 class ForumAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'order', 'is_locked', 'created_at']
+    list_display = ['name', 'category', 'order', 'is_locked', 'topic_count', 'post_count', 'created_at']
     list_filter = ['category', 'is_locked']
     list_editable = ['order', 'is_locked']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
+    readonly_fields = ['topic_count', 'post_count', 'last_post', 'last_post_at']
 
 
 @admin.register(Topic)
@@ -30,6 +31,7 @@ class TopicAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
     search_fields = ['title', 'author__username']
     date_hierarchy = 'created_at'
+    readonly_fields = ['post_count', 'last_post', 'last_post_at']
 
 
 @admin.register(Post)
@@ -43,6 +45,20 @@ class PostAdmin(admin.ModelAdmin):
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'post_count', 'location', 'joined_date']
+    list_display = ['user', 'post_count', 'topic_count', 'location', 'joined_date']
     search_fields = ['user__username', 'bio', 'location']
-    readonly_fields = ['joined_date', 'post_count']
+    readonly_fields = ['joined_date', 'post_count', 'topic_count']
+
+
+@admin.register(SiteStats)
+class SiteStatsAdmin(admin.ModelAdmin):
+    list_display = ['total_topics', 'total_posts', 'total_users', 'latest_member', 'reconciled_at']
+    readonly_fields = ['total_topics', 'total_posts', 'total_users', 'latest_member', 'reconciled_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'key']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_at', 'last_error']
@@ -0,0 +1,12 @@
+"""
+Forum application configuration.
+"""
+from django.apps import AppConfig
+
+
+class ForumConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'forum'
+
+    def ready(self):
+        from . import db, signals  # noqa: F401
@@ -0,0 +1,237 @@
+"""
+Async versions of the read-only forum views, served under ASGI.
+
+Data is loaded with the async ORM and independent queries are awaited
+together. Django still runs each query through its thread-sensitive sync
+adapter, so the gain is that slow clients and waiting requests no longer
+hold a worker, not parallel SQL. Templates are rendered in a thread since
+they may touch lazy relations and ``request.user``.
+
+``topic_events`` is routed under WSGI too, where it degrades to polling.
+"""
+import asyncio
+import time
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+
+from . import live, metrics, reading, routing
+from .counters import view_counter
+from .decorators import anonymous_page_cache
+from .models import Category, Forum, Topic, Post, SiteStats
+from .pagination import KeysetPaginator, TOPIC_ORDERING, POST_ORDERING
+from .routers import primary
+from .search import get_search_backend
+from .forms import PostForm
+from .views import _index_state, _category_state, _forum_state, _topic_state, _record_view, _live_topic_url
+
+arender = sync_to_async(render)
+
+
+async def _page(queryset, per_page, ordering, request):
+    """Keyset page, or numbered page for old ?page= links."""
+    if 'page' in request.GET:
+        page = await sync_to_async(Paginator(queryset, per_page).get_page)(request.GET.get('page'))
+        page.object_list = [obj async for obj in page.object_list]
+        return page
+    return await KeysetPaginator(queryset, per_page, ordering).aget_page(request.GET.get('cursor'))
+
+
+@anonymous_page_cache(_index_state)
+async def index(request):
+    """Homepage showing all categories and forums."""
+    forums = Forum.objects.select_related(
+        'category', 'last_post__author', 'last_post__topic__forum__category'
+    )
+    # Left lazy: on a fragment cache hit the template never evaluates it
+    categories = Category.objects.prefetch_related(Prefetch('forums', queryset=forums)).all()
+
+    stats = await sync_to_async(SiteStats.get)()
+    user = await request.auser()
+
+    context = {
+        'categories': categories,
+        'stats': stats,
+        'fragment_timeout': settings.FORUM_FRAGMENT_CACHE_TIMEOUT,
+        'unread_counts': await sync_to_async(reading.unread_counts)(user),
+    }
+    return await arender(request, 'forum/index.html', context)
+
+
+@anonymous_page_cache(_category_state)
+async def category_detail(request, slug):
+    """Show all forums in a category."""
+    forums = Forum.objects.filter(category__slug=slug).select_related('last_post__author', 'last_post__topic')
+    category, forums = await asyncio.gather(
+        aget_object_or_404(Category, slug=slug),
+        _alist(forums),
+    )
+
+    context = {
+        'category': category,
+        'forums': forums,
+    }
+    return await arender(request, 'forum/category_detail.html', context)
+
+
+@anonymous_page_cache(_forum_state)
+async def forum_detail(request, category_slug, forum_slug):
+    """Show all topics in a forum."""
+    forum_id = await sync_to_async(routing.forum_id)(category_slug, forum_slug)
+    if forum_id is None:
+        raise Http404
+    topics_list = Topic.objects.filter(forum_id=forum_id).select_related('author', 'forum', 'last_post__author')
+
+    forum, topics = await asyncio.gather(
+        aget_object_or_404(Forum.objects.select_related('category'), pk=forum_id),
+        _page(topics_list, 20, TOPIC_ORDERING, request),
+    )
+    view_counter.apply(topics)
+    await sync_to_async(reading.annotate_unread)(await request.auser(), forum_id, topics)
+
+    context = {
+        'forum': forum,
+        'topics': topics,
+    }
+    return await arender(request, 'forum/forum_detail.html', context)
+
+
+@anonymous_page_cache(_topic_state, on_hit=_record_view)
+async def topic_detail(request, category_slug, forum_slug, topic_slug, pk):
+    """Show all posts in a topic."""
+    posts_list = Post.objects.filter(topic_id=pk).select_related('author', 'author__profile')
+
+    topic, posts = await asyncio.gather(
+        aget_object_or_404(Topic.objects.select_related('forum__category', 'author'), pk=pk, slug=topic_slug),
+        _page(posts_list, settings.FORUM_POSTS_PER_PAGE, POST_ORDERING, request),
+    )
+
+    # Increment view count (buffered, or written through the ORM if FORUM_VIEW_FLUSH_INTERVAL <= 0)
+    await sync_to_async(topic.increment_views)()
+
+    user = await request.auser()
+    await sync_to_async(reading.mark_topic_read)(user, topic)
+    form = PostForm() if user.is_authenticated else None
+
+    context = {
+        'topic': topic,
+        'posts': posts,
+        'form': form,
+        'live_topic_url': _live_topic_url(topic.pk, posts),
+    }
+    return await arender(request, 'forum/topic_detail.html', context)
+
+
+async def search(request):
+    """Search topics and posts."""
+    query = request.GET.get('q', '').strip()
+    results = []
+
+    if query:
+        start = time.perf_counter()
+        paginator = Paginator(get_search_backend().search(query), 20)
+        results = await sync_to_async(paginator.get_page)(request.GET.get('page'))
+        results.object_list = await sync_to_async(list)(results.object_list)
+        metrics.search_duration.observe(time.perf_counter() - start)
+
+    context = {
+        'query': query,
+        'results': results,
+    }
+    return await arender(request, 'forum/search.html', context)
+
+
+async def topic_events(request, pk):
+    """
+    Stream the topic's new posts as server-sent events.
+
+    Each event carries the post id and its rendered HTML. Posts after the
+    ``Last-Event-ID`` header (or ``?after=`` on the first connection) are
+    replayed first, so a reconnecting reader catches up without reloading
+    the page. Under WSGI the replay is sent alone and the browser polls
+    again after the ``retry`` delay.
+    """
+    if not await _off_request(Topic.objects.filter(pk=pk).exists):
+        raise Http404
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    after = int(after) if after and after.isdigit() else None
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not settings.FORUM_ASYNC_VIEWS:
+        events = await _off_request(_replay, pk, after)
+        body = f'retry: {settings.FORUM_LIVE_POLL_MS}\n\n' + ''.join(event.encode() for event in events)
+        return HttpResponse(body, content_type='text/event-stream', headers=headers)
+    return StreamingHttpResponse(_topic_stream(pk, after), content_type='text/event-stream', headers=headers)
+
+
+async def _off_request(func, *args):
+    """
+    Run ``func`` in the shared thread pool and close its connections there.
+
+    A thread-sensitive call would start the request's own executor thread,
+    which then lives as long as the stream: one idle OS thread per reader.
+    """
+    def call():
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+def _replay(topic_id, after):
+    if after is None:
+        return []
+    # From the primary: a lagging replica would skip posts for good
+    with primary():
+        posts = Post.objects.filter(topic_id=topic_id, pk__gt=after).select_related('author', 'topic')
+        return [live.post_event(post) for post in posts.order_by('pk')[:settings.FORUM_LIVE_REPLAY_LIMIT]]
+
+
+def _release_request_thread():
+    """
+    Shut down the request's thread-sensitive executor.
+
+    Django's sync middleware hooks ran in it, and its thread would otherwise
+    idle until the stream ends. The middleware is done once the body is
+    being sent; a later thread-sensitive call just starts a new executor.
+    These are asgiref internals (pinned in requirements.txt): without them
+    the thread is simply kept until the stream ends.
+    """
+    contextvar = getattr(SyncToAsync, 'thread_sensitive_context', None)
+    executors = getattr(SyncToAsync, 'context_to_thread_executor', None)
+    if contextvar is None or executors is None:
+        return
+    executor = executors.pop(contextvar.get(None), None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def _topic_stream(topic_id, after):
+    _release_request_thread()
+    # Subscribe before the replay so no post falls between the two
+    subscription = live.get_broker().subscribe(live.topic_channel(topic_id))
+    try:
+        yield f'retry: {settings.FORUM_LIVE_RETRY_MS}\n\n'
+        for event in await _off_request(_replay, topic_id, after):
+            after = event.id
+            yield event.encode()
+
+        while not subscription.overflowed:
+            event = await subscription.get(settings.FORUM_LIVE_HEARTBEAT)
+            if event is None:
+                yield ': ping\n\n'
+            elif after is None or event.id > after:
+                after = event.id
+                yield event.encode()
+    finally:
+        subscription.close()
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
@@ -0,0 +1,144 @@
+"""
+Avatar processing.
+
+Uploads are checked when the profile form is submitted; the rest runs in a
+background job (forum.tasks.process_avatar): the upload is replaced by a
+clean copy without EXIF metadata, at most FORUM_AVATAR_MAX_SIZE pixels
+wide, and square thumbnails of every FORUM_AVATAR_SIZES size are written in
+WebP and JPEG. File names carry a hash of the image, so their URLs never
+change content and can be cached for good.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Extension and Pillow options per output format
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# The cleaned upload, kept to generate thumbnails again; lossless so that
+# reprocessing it gives the same bytes, hence the same version
+MASTER_FORMAT = ('WEBP', {'lossless': True})
+
+
+def get_sizes():
+    return tuple(getattr(settings, 'FORUM_AVATAR_SIZES', (48, 96, 256)))
+
+
+def validate_avatar(file):
+    """Reject files that are too large, not images, or of an unexpected format."""
+    max_bytes = getattr(settings, 'FORUM_AVATAR_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+    if file.size > max_bytes:
+        raise ValidationError(f"L'image ne doit pas dépasser {max_bytes // (1024 * 1024)} Mo.")
+    max_pixels = getattr(settings, 'FORUM_AVATAR_MAX_PIXELS', 25_000_000)
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ValidationError("Formats acceptés : JPEG, PNG, GIF et WebP.")
+            if image.width * image.height > max_pixels:
+                raise ValidationError("L'image est trop grande.")
+            image.verify()
+    except ValidationError:
+        raise
+    except Exception:
+        raise ValidationError("Ce fichier n'est pas une image valide.")
+    finally:
+        file.seek(0)
+
+
+def master_name(user_id, version):
+    return f'avatars/{user_id}-{version}.webp'
+
+
+def thumbnail_dir(user_id):
+    return f'avatars/thumbs/{user_id}'
+
+
+def thumbnail_name(user_id, version, size, fmt):
+    return f'{thumbnail_dir(user_id)}/{version}-{size}.{fmt}'
+
+
+def thumbnail_url(user_id, version, size, fmt):
+    return default_storage.url(thumbnail_name(user_id, version, size, fmt))
+
+
+def _open(name):
+    with default_storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        image.load()
+    # Apply the EXIF orientation, then drop the metadata with the rest of EXIF
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _encode(image, fmt):
+    pil_format, options = MASTER_FORMAT if fmt == 'master' else FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _write(name, content, force=False):
+    # Names are content hashes: an existing file is already right
+    if default_storage.exists(name):
+        if not force:
+            return
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(content))
+
+
+def process(user_id, name, force=False):
+    """
+    Clean the uploaded avatar ``name`` and write its thumbnails.
+
+    Returns ``(clean_name, version)``; the caller points the profile at
+    ``clean_name``, then prunes the other versions. ``force`` rewrites the
+    current thumbnails too.
+    """
+    image = _open(name)
+    max_size = getattr(settings, 'FORUM_AVATAR_MAX_SIZE', 1024)
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    clean = _encode(image, 'master')
+    version = hashlib.sha1(clean).hexdigest()[:12]
+    clean_name = master_name(user_id, version)
+    _write(clean_name, clean)
+
+    for size in get_sizes():
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            _write(thumbnail_name(user_id, version, size, fmt), _encode(thumbnail, fmt), force)
+    return clean_name, version
+
+
+def prune(user_id, keep=None):
+    """Delete the cleaned avatars and thumbnails of ``user_id`` other than version ``keep``."""
+    directory = thumbnail_dir(user_id)
+    try:
+        files = default_storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return
+    versions = set()
+    for file in files:
+        version = file.split('-', 1)[0]
+        if version != keep:
+            versions.add(version)
+            default_storage.delete(posixpath.join(directory, file))
+    # Each version's cleaned avatar, found through its thumbnails
+    for version in versions:
+        default_storage.delete(master_name(user_id, version))
@@ -0,0 +1,418 @@
+"""
+Bulk import and export of forum data, for migrating large boards.
+
+Records are plain dicts with a ``type`` (category, forum, user, topic,
+post) and the fields of SCHEMAS; references to other records use their
+legacy ``id``. JSON Lines files mix all types, parents first; CSV files
+hold one type each, named after it (``posts.csv``). Users carry their
+profile fields.
+
+Imports stream the input, insert with bulk_create (no save(), no
+signals) and commit one chunk of records per transaction together with
+the position reached and the new legacy id -> pk pairs, so an
+interrupted import resumes exactly where it stopped. Post Markdown is
+rendered in a process pool before insertion; posts that fail to render
+are skipped. Counters, search index and site totals are rebuilt at the
+end with the maintenance commands.
+"""
+import csv
+import itertools
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from .models import Category, Forum, Topic, Post, UserProfile, ImportCheckpoint, ImportIdMap
+from .rendering import get_renderer_config, get_renderer_version, render_markdown
+
+# Fields per record type, in export order; 'ref:<type>' fields hold a legacy id
+SCHEMAS = {
+    'category': {
+        'id': 'str', 'name': 'str', 'slug': 'str', 'description': 'str', 'icon': 'str', 'color': 'str',
+        'order': 'int', 'created_at': 'datetime',
+    },
+    'forum': {
+        'id': 'str', 'category': 'ref:category', 'name': 'str', 'slug': 'str', 'description': 'str',
+        'icon': 'str', 'order': 'int', 'is_locked': 'bool', 'created_at': 'datetime',
+    },
+    'user': {
+        'id': 'str', 'username': 'str', 'email': 'str', 'password': 'str', 'is_active': 'bool',
+        'date_joined': 'datetime', 'bio': 'str', 'location': 'str', 'website': 'str', 'signature': 'str',
+    },
+    'topic': {
+        'id': 'str', 'forum': 'ref:forum', 'author': 'ref:user', 'title': 'str', 'slug': 'str',
+        'is_pinned': 'bool', 'is_locked': 'bool', 'is_announced': 'bool', 'views': 'int',
+        'created_at': 'datetime', 'updated_at': 'datetime',
+    },
+    'post': {
+        'id': 'str', 'topic': 'ref:topic', 'author': 'ref:user', 'content': 'str',
+        'is_edited': 'bool', 'edited_at': 'datetime', 'created_at': 'datetime',
+    },
+}
+# Insertion order within a chunk, parents first
+TYPES = list(SCHEMAS)
+# Types whose legacy ids are referenced by other records
+MAPPED_TYPES = ('category', 'forum', 'user', 'topic')
+
+
+class BulkImportError(Exception):
+    pass
+
+
+def coerce(value, kind):
+    """Field value from JSON or CSV text to Python."""
+    if value is None or value == '':
+        return None
+    if kind == 'int':
+        return int(value)
+    if kind == 'bool':
+        return value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes', 'oui')
+    if kind == 'datetime':
+        parsed = value if isinstance(value, datetime) else parse_datetime(str(value))
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+    return str(value)
+
+
+def clean(record_type, record):
+    schema = SCHEMAS[record_type]
+    return {field: coerce(record.get(field), kind) for field, kind in schema.items()}
+
+
+def read_jsonl(path):
+    """``(type, record)`` for each line of a JSON Lines file."""
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record_type = record.get('type')
+            if record_type not in SCHEMAS:
+                raise BulkImportError(f"{path}:{number}: type inconnu {record_type!r}")
+            yield record_type, clean(record_type, record)
+
+
+def csv_type(path):
+    """Record type of a CSV file, from its name (``posts.csv`` -> post)."""
+    stem = str(path).rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    for record_type in SCHEMAS:
+        if stem in (record_type, f'{record_type}s', 'categories' if record_type == 'category' else None):
+            return record_type
+    raise BulkImportError(f"{path} : impossible de déduire le type du nom de fichier")
+
+
+def read_csv(path):
+    record_type = csv_type(path)
+    with open(path, encoding='utf-8', newline='') as file:
+        for record in csv.DictReader(file):
+            yield record_type, clean(record_type, record)
+
+
+def read(path):
+    return read_jsonl(path) if str(path).endswith(('.jsonl', '.ndjson')) else read_csv(path)
+
+
+def prerender(content, config):
+    """Rendered HTML of a post, or None when its Markdown cannot be rendered."""
+    try:
+        return render_markdown(content, config=config)
+    except Exception:
+        return None
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """Let bulk_create store the given created_at/updated_at instead of now."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """
+    Import streams of ``(type, record)`` under a name; importing the same
+    name again skips what was already committed.
+    """
+
+    def __init__(self, name, batch_size=1000, chunk_size=10000, pool=None, log=None):
+        self.name = name
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.pool = pool
+        self.log = log or (lambda message: None)
+        self.render = partial(prerender, config=get_renderer_config())
+        self.renderer_version = get_renderer_version()
+        self.counts = dict.fromkeys(TYPES, 0)
+        self.skipped = dict.fromkeys(TYPES, 0)
+        self.ids = {kind: {} for kind in MAPPED_TYPES}
+        for kind, legacy_id, new_id in ImportIdMap.objects.filter(source=name).values_list(
+                'kind', 'legacy_id', 'new_id').iterator(chunk_size=10000):
+            self.ids[kind][legacy_id] = new_id
+
+    def run(self, source, records):
+        """Import ``records`` from ``source`` (a file), resuming from its checkpoint."""
+        key = f'{self.name}:{source}'
+        checkpoint = ImportCheckpoint.objects.filter(source=key).first()
+        position = checkpoint.position if checkpoint else 0
+        if position:
+            self.log(f"{source} : reprise après {position} enregistrements.")
+        records = itertools.islice(records, position, None)
+
+        with keep_timestamps(Category, Forum, Topic, Post):
+            while chunk := list(itertools.islice(records, self.chunk_size)):
+                position += len(chunk)
+                self.import_chunk(chunk, key, position)
+                self.log(f"{source} : {position} enregistrements.")
+        return position
+
+    def import_chunk(self, chunk, checkpoint, position):
+        """Insert a chunk; its rows, id map entries and checkpoint commit together."""
+        by_type = {record_type: [] for record_type in TYPES}
+        for record_type, record in chunk:
+            by_type[record_type].append(record)
+        posts = by_type['post']
+        # Render posts in parallel before opening the transaction
+        if posts:
+            contents = [record['content'] or '' for record in posts]
+            if self.pool is not None:
+                chunksize = max(1, len(contents) // 64)
+                rendered = list(self.pool.map(self.render, contents, chunksize=chunksize))
+            else:
+                rendered = [self.render(content) for content in contents]
+            for record, html in zip(posts, rendered):
+                record['content_html'] = html
+
+        importers = {
+            'category': self.import_categories, 'forum': self.import_forums, 'user': self.import_users,
+            'topic': self.import_topics, 'post': self.import_posts,
+        }
+        with transaction.atomic():
+            new_ids = []
+            for record_type in TYPES:
+                if by_type[record_type]:
+                    new_ids += importers[record_type](by_type[record_type])
+            ImportIdMap.objects.bulk_create(new_ids, batch_size=self.batch_size)
+            ImportCheckpoint.objects.update_or_create(source=checkpoint, defaults={'position': position})
+
+    # One method per type: build rows, resolve references, bulk insert
+
+    def _ref(self, kind, legacy_id):
+        return self.ids[kind].get(legacy_id)
+
+    def _map(self, kind, records, objects):
+        rows = []
+        for record, obj in zip(records, objects):
+            if record['id'] is not None:
+                self.ids[kind][record['id']] = obj.pk
+                rows.append(ImportIdMap(source=self.name, kind=kind, legacy_id=record['id'], new_id=obj.pk))
+        return rows
+
+    def _skip_known(self, kind, records):
+        """Records not imported yet (by legacy id)."""
+        return [record for record in records if record['id'] is None or record['id'] not in self.ids[kind]]
+
+    def import_categories(self, records):
+        records = self._skip_known('category', records)
+        for record in records:
+            record['slug'] = record['slug'] or slugify(record['name'])
+        existing = dict(Category.objects.filter(
+            slug__in=[record['slug'] for record in records]).values_list('slug', 'pk'))
+        new = [record for record in records if record['slug'] not in existing]
+        objects = Category.objects.bulk_create([
+            Category(
+                name=record['name'], slug=record['slug'], description=record['description'] or '',
+                icon=record['icon'] or '📁', color=record['color'] or '#315620', order=record['order'] or 0,
+                created_at=record['created_at'] or timezone.now(),
+            ) for record in new
+        ], batch_size=self.batch_size)
+        objects = {record['slug']: obj for record, obj in zip(new, objects)}
+        self.counts['category'] += len(new)
+        # Categories already on the board are merged into
+        return self._map('category', records, [
+            objects.get(record['slug']) or Category(pk=existing[record['slug']]) for record in records
+        ])
+
+    def import_forums(self, records):
+        records, orphans = self._resolve(self._skip_known('forum', records), category='category')
+        self.skipped['forum'] += orphans
+        for record in records:
+            record['slug'] = record['slug'] or slugify(record['name'])
+        existing = {
+            (category_id, slug): pk for pk, category_id, slug in Forum.objects.filter(
+                category__in={record['category'] for record in records},
+                slug__in={record['slug'] for record in records},
+            ).values_list('pk', 'category_id', 'slug')
+        }
+        new = [record for record in records if (record['category'], record['slug']) not in existing]
+        now = timezone.now()
+        objects = Forum.objects.bulk_create([
+            Forum(
+                category_id=record['category'], name=record['name'], slug=record['slug'],
+                description=record['description'] or '', icon=record['icon'] or '💬', order=record['order'] or 0,
+                is_locked=bool(record['is_locked']), created_at=record['created_at'] or now, updated_at=now,
+            ) for record in new
+        ], batch_size=self.batch_size)
+        objects = {(record['category'], record['slug']): obj for record, obj in zip(new, objects)}
+        self.counts['forum'] += len(new)
+        return self._map('forum', records, [
+            objects.get(key) or Forum(pk=existing[key])
+            for key in ((record['category'], record['slug']) for record in records)
+        ])
+
+    def import_users(self, records):
+        records = self._skip_known('user', records)
+        existing = dict(User.objects.filter(
+            username__in=[record['username'] for record in records]).values_list('username', 'pk'))
+        new = [record for record in records if record['username'] not in existing]
+        unusable = make_password(None)
+        users = User.objects.bulk_create([
+            User(
+                username=record['username'], email=record['email'] or '',
+                # Only Django hashes are usable; other members reset their password
+                password=record['password'] if record['password'] and '$' in record['password'] else unusable,
+                is_active=record['is_active'] is not False, date_joined=record['date_joined'] or timezone.now(),
+            ) for record in new
+        ], batch_size=self.batch_size)
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user=user, bio=record['bio'] or '', location=record['location'] or '',
+                website=record['website'] or '', signature=record['signature'] or '',
+            ) for record, user in zip(new, users)
+        ], batch_size=self.batch_size)
+        self.counts['user'] += len(new)
+        users = {user.username: user for user in users}
+        return self._map('user', records, [
+            users.get(record['username']) or User(pk=existing[record['username']]) for record in records
+        ])
+
+    def import_topics(self, records):
+        records, orphans = self._resolve(self._skip_known('topic', records), forum='forum', author='user')
+        self.skipped['topic'] += orphans
+        objects = []
+        for record in records:
+            created_at = record['created_at'] or timezone.now()
+            objects.append(Topic(
+                forum_id=record['forum'], author_id=record['author'], title=record['title'],
+                slug=record['slug'] or slugify(record['title'])[:250],
+                is_pinned=bool(record['is_pinned']), is_locked=bool(record['is_locked']),
+                is_announced=bool(record['is_announced']), views=record['views'] or 0,
+                created_at=created_at, updated_at=record['updated_at'] or created_at,
+            ))
+        objects = Topic.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts['topic'] += len(objects)
+        return self._map('topic', records, objects)
+
+    def import_posts(self, records):
+        records, orphans = self._resolve(records, topic='topic', author='user')
+        invalid = [record for record in records if record['content_html'] is None or not record['content']]
+        records = [record for record in records if record['content_html'] is not None and record['content']]
+        self.skipped['post'] += orphans + len(invalid)
+        Post.objects.bulk_create([
+            Post(
+                topic_id=record['topic'], author_id=record['author'], content=record['content'],
+                content_html=record['content_html'], content_html_version=self.renderer_version,
+                is_edited=bool(record['is_edited']), edited_at=record['edited_at'],
+                created_at=record['created_at'] or timezone.now(),
+            ) for record in records
+        ], batch_size=self.batch_size)
+        self.counts['post'] += len(records)
+        return []
+
+    def _resolve(self, records, **refs):
+        """Replace legacy references by new pks; drop records whose parent is unknown."""
+        resolved = []
+        for record in records:
+            for field, kind in refs.items():
+                record[field] = self._ref(kind, record[field])
+            if all(record[field] is not None for field in refs):
+                resolved.append(record)
+        return resolved, len(records) - len(resolved)
+
+
+def export_records(chunk_size=2000):
+    """``(type, record)`` for the whole board, parents first, in constant memory."""
+    for category in Category.objects.order_by('pk').iterator(chunk_size=chunk_size):
+        yield 'category', {
+            'id': category.pk, 'name': category.name, 'slug': category.slug, 'description': category.description,
+            'icon': category.icon, 'color': category.color, 'order': category.order,
+            'created_at': category.created_at,
+        }
+    for forum in Forum.objects.order_by('pk').iterator(chunk_size=chunk_size):
+        yield 'forum', {
+            'id': forum.pk, 'category': forum.category_id, 'name': forum.name, 'slug': forum.slug,
+            'description': forum.description, 'icon': forum.icon, 'order': forum.order,
+            'is_locked': forum.is_locked, 'created_at': forum.created_at,
+        }
+    users = User.objects.select_related('profile').order_by('pk')
+    for user in users.iterator(chunk_size=chunk_size):
+        profile = getattr(user, 'profile', None)
+        yield 'user', {
+            'id': user.pk, 'username': user.username, 'email': user.email, 'password': user.password,
+            'is_active': user.is_active, 'date_joined': user.date_joined,
+            **{field: getattr(profile, field, '') for field in ('bio', 'location', 'website', 'signature')},
+        }
+    topics = Topic.objects.order_by('pk').values(*[
+        'pk', 'forum_id', 'author_id', 'title', 'slug', 'is_pinned', 'is_locked', 'is_announced', 'views',
+        'created_at', 'updated_at',
+    ])
+    for topic in topics.iterator(chunk_size=chunk_size):
+        yield 'topic', {
+            'id': topic.pop('pk'), 'forum': topic.pop('forum_id'), 'author': topic.pop('author_id'), **topic,
+        }
+    posts = Post.objects.order_by('pk').values(
+        'pk', 'topic_id', 'author_id', 'content', 'is_edited', 'edited_at', 'created_at'
+    )
+    for post in posts.iterator(chunk_size=chunk_size):
+        yield 'post', {'id': post.pop('pk'), 'topic': post.pop('topic_id'), 'author': post.pop('author_id'), **post}
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def write_jsonl(records, file):
+    count = 0
+    for record_type, record in records:
+        file.write(json.dumps({'type': record_type, **{k: _text(v) for k, v in record.items()}},
+                              ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def write_csv(records, open_file):
+    """Write each type to the file returned by ``open_file(type)``."""
+    count = 0
+    writers = {}
+    files = []
+    try:
+        for record_type, record in records:
+            if record_type not in writers:
+                file = open_file(record_type)
+                files.append(file)
+                writers[record_type] = csv.DictWriter(file, fieldnames=list(SCHEMAS[record_type]))
+                writers[record_type].writeheader()
+            writers[record_type].writerow({k: _text(v) for k, v in record.items()})
+            count += 1
+    finally:
+        for file in files:
+            file.close()
+    return count
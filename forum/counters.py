@@ -0,0 +1,101 @@
+"""
+Write-behind buffer for topic view counts.
+
+Page views are accumulated in memory and flushed periodically as batched
+``F('views') + n`` updates, so readers never wait on a write lock.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Per-process buffer of pending view increments keyed by topic id."""
+
+    def __init__(self):
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'FORUM_VIEW_FLUSH_INTERVAL', 10)
+
+    def incr(self, topic_id, n=1):
+        """
+        Record ``n`` views and return how many must be added to a value
+        loaded before this call to get the up-to-date count.
+        """
+        if self.interval <= 0:
+            self._write({topic_id: n})
+            return n
+        with self._lock:
+            self._pending[topic_id] += n
+            pending = self._pending[topic_id]
+        self._ensure_thread()
+        return pending
+
+    def pending(self, topic_id):
+        return self._pending.get(topic_id, 0)
+
+    def apply(self, topics):
+        """Add pending increments to the ``views`` of already loaded topics."""
+        for topic in topics:
+            topic.views += self.pending(topic.pk)
+        return topics
+
+    def flush(self):
+        """Write all pending increments to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+        try:
+            self._write(pending)
+        except Exception:
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                for topic_id, n in pending.items():
+                    self._pending[topic_id] += n
+            raise
+        return sum(pending.values())
+
+    def _write(self, deltas):
+        from .models import Topic
+
+        # One UPDATE per distinct increment rather than one per topic
+        by_delta = defaultdict(list)
+        for topic_id, n in deltas.items():
+            by_delta[n].append(topic_id)
+        for n, topic_ids in by_delta.items():
+            Topic.objects.filter(pk__in=topic_ids).update(views=F('views') + n)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush topic view counts")
+            finally:
+                connection.close()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
@@ -0,0 +1,97 @@
+"""
+Response caching for anonymous readers.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from . import metrics
+from .routers import primary
+
+
+def anonymous_page_cache(get_state, on_hit=None):
+    """
+    Cache a read view's responses for anonymous users and answer
+    conditional GETs with 304. Works on sync and async views.
+
+    ``get_state(request, *args, **kwargs)`` returns the version of the data
+    shown by the page, or ``None`` to bypass the cache (e.g. unknown object,
+    so the view can 404). The version must change whenever the page would;
+    it becomes the ETag and part of the cache key. No Last-Modified is sent:
+    edits and deletions do not advance any timestamp, so If-Modified-Since
+    would get stale 304s. ``on_hit`` is called when the view itself is
+    skipped.
+
+    Pages that will be cached are rendered from the primary database: a
+    lagging replica would otherwise store stale content under the new version.
+    """
+    def lookup(request, *args, **kwargs):
+        """Return ``(response, store)``: a cached/304 response, or a callable storing the fresh one."""
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated
+                or len(messages.get_messages(request))):
+            return None, None
+
+        version = get_state(request, *args, **kwargs)
+        if version is None:
+            return None, None
+        etag = quote_etag(hashlib.md5(str(version).encode()).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        key = 'page:%s:%s' % (hashlib.md5(request.get_full_path().encode()).hexdigest(), etag)
+        if response is None:
+            response = cache.get(key)
+        if response is None:
+            metrics.cache_requests.inc(cache='page', result='miss')
+
+            def store(response):
+                if response.status_code == 200 and not response.streaming and not response.cookies:
+                    _set_validators(response, etag)
+                    cache.set(key, response, getattr(settings, 'FORUM_PAGE_CACHE_TIMEOUT', 300))
+                return response
+            return None, store
+
+        metrics.cache_requests.inc(cache='page', result='hit')
+        if on_hit is not None:
+            on_hit(request, *args, **kwargs)
+        _set_validators(response, etag)
+        return response, None
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, store = await sync_to_async(lookup)(request, *args, **kwargs)
+                if response is not None:
+                    return response
+                if store is None:
+                    return await view(request, *args, **kwargs)
+                with primary():
+                    response = await view(request, *args, **kwargs)
+                return await sync_to_async(store)(response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, store = lookup(request, *args, **kwargs)
+            if response is not None:
+                return response
+            if store is None:
+                return view(request, *args, **kwargs)
+            with primary():
+                response = view(request, *args, **kwargs)
+            return store(response)
+        return wrapper
+    return decorator
+
+
+def _set_validators(response, etag):
+    response.headers['ETag'] = etag
+    # The same URL renders differently once logged in
+    patch_vary_headers(response, ['Cookie'])
@@ -0,0 +1,73 @@
+"""
+Version numbers for template fragment caching.
+
+Each category, forum and topic has a version kept in the cache, plus one
+for the whole category/forum tree. Fragments include the version in their cache
+key, and signal handlers bump the versions when the underlying rows
+change, so stale fragments are simply never looked up again.
+
+Two named versions cover what most pages show but rarely changes: the
+names and slugs of categories and forums (``STRUCTURE``), and member
+names, avatars and profiles (``MEMBERS``).
+"""
+import time
+
+from django.core.cache import cache
+from .models import Category, Forum
+
+TREE = 'tree'
+STRUCTURE = 'structure'
+MEMBERS = 'members'
+
+
+def version_key(obj=None):
+    """Cache key of the version of a model instance, or of a named version (the tree by default)."""
+    if obj is None:
+        obj = TREE
+    if isinstance(obj, str):
+        return f'fragments:version:{obj}'
+    return f'fragments:version:{obj._meta.model_name}:{obj.pk}'
+
+
+def _initial_version():
+    # Time based, so a version evicted from the cache never restarts at a
+    # value that old fragments were stored under
+    return int(time.time() * 1000)
+
+
+def get_version(obj=None):
+    key = version_key(obj)
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_versions(objs):
+    """``{obj.pk: version}`` of several objects of a model, in one cache round trip."""
+    keys = {version_key(obj): obj for obj in objs}
+    found = cache.get_many(keys)
+    return {
+        obj.pk: found[key] if key in found else get_version(obj)
+        for key, obj in keys.items()
+    }
+
+
+def bump_version(obj=None):
+    key = version_key(obj)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def bump_forum(forum_id, category_id=None):
+    """Invalidate the fragments showing a forum, its category and the tree."""
+    if category_id is None:
+        category_id = Forum.objects.filter(pk=forum_id).values_list('category_id', flat=True).first()
+    bump_version(Forum(pk=forum_id))
+    if category_id is not None:
+        bump_version(Category(pk=category_id))
+    bump_version()
@@ -0,0 +1,152 @@
+"""
+Persistent background jobs.
+
+Functions decorated with ``@job`` can be queued with ``enqueue()`` (or
+``enqueue_on_commit()`` from inside a write transaction) and are run by the
+``run_jobs`` worker. A job that raises is retried with exponential backoff
+up to ``max_attempts`` times; a job whose worker died is retried after
+``FORUM_JOBS_TIMEOUT`` seconds. A job given the idempotency ``key`` of a
+pending or running job is not queued again; once that one has finished,
+the key can be queued anew. Jobs must also be safe to run twice.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .routers import primary
+
+logger = logging.getLogger('forum.jobs')
+
+registry = {}
+
+
+def job(func=None, *, max_attempts=None):
+    """Register a function as a job, under its dotted path."""
+    if func is None:
+        return partial(job, max_attempts=max_attempts)
+    func.job_name = f'{func.__module__}.{func.__name__}'
+    func.max_attempts = max_attempts or getattr(settings, 'FORUM_JOBS_MAX_ATTEMPTS', 5)
+    registry[func.job_name] = func
+    return func
+
+
+def enqueue(func, *args, key=None, delay=0, **kwargs):
+    """
+    Queue ``func(*args, **kwargs)``; arguments must be JSON-serializable.
+    Returns the Job, or the pending/running one already queued under ``key``.
+    With FORUM_JOBS_EAGER the function runs right away instead.
+    """
+    if getattr(settings, 'FORUM_JOBS_EAGER', False):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Job %s failed", func.job_name)
+        return None
+
+    fields = {
+        'name': func.job_name,
+        'args': list(args),
+        'kwargs': kwargs,
+        'max_attempts': func.max_attempts,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    with primary():
+        if key is None:
+            return Job.objects.create(**fields)
+        active = Job.objects.filter(key=key, status__in=[Job.PENDING, Job.RUNNING])
+        while True:
+            existing = active.first()
+            if existing is not None:
+                return existing
+            try:
+                with transaction.atomic():
+                    return Job.objects.create(key=key, **fields)
+            except IntegrityError:
+                # Queued concurrently; it may even have finished since
+                continue
+
+
+def enqueue_on_commit(func, *args, **kwargs):
+    """Queue the job once the current transaction commits, not if it rolls back."""
+    transaction.on_commit(partial(enqueue, func, *args, **kwargs))
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling, capped, with jitter."""
+    base = getattr(settings, 'FORUM_JOBS_BACKOFF', 10)
+    cap = getattr(settings, 'FORUM_JOBS_MAX_BACKOFF', 3600)
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.75, 1.25)
+
+
+def claim(limit, worker):
+    """Mark up to ``limit`` due jobs as running for ``worker`` and return them."""
+    now = timezone.now()
+    due = list(
+        Job.objects.filter(status=Job.PENDING, run_at__lte=now).values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    # The status condition makes the claim exclusive between workers
+    Job.objects.filter(pk__in=due, status=Job.PENDING).update(
+        status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+    )
+    return list(Job.objects.filter(pk__in=due, status=Job.RUNNING, locked_by=worker, locked_at=now))
+
+
+def run(job):
+    """Run a claimed job and record the outcome."""
+    with primary():
+        try:
+            func = registry.get(job.name)
+            if func is None:
+                raise LookupError(f"Unknown job {job.name}")
+            func(*job.args, **job.kwargs)
+        except Exception:
+            fail(job, traceback.format_exc())
+            return False
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+        return True
+
+
+def fail(job, error):
+    if job.attempts >= job.max_attempts:
+        logger.error("Job %s (#%s) failed for good:\n%s", job.name, job.pk, error)
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+    else:
+        logger.warning("Job %s (#%s) failed, attempt %s/%s", job.name, job.pk, job.attempts, job.max_attempts)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.PENDING,
+            run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+            last_error=error,
+        )
+
+
+def requeue_stale():
+    """Retry the jobs of workers that died mid-job."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'FORUM_JOBS_TIMEOUT', 300))
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff)
+    error = "Worker timed out"
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(), last_error=error
+    )
+    return stale.update(status=Job.PENDING, run_at=timezone.now(), last_error=error)
+
+
+def purge(days):
+    """Delete jobs that finished more than ``days`` days ago."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()[0]
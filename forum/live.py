@@ -0,0 +1,130 @@
+"""
+Live topic updates: publish/subscribe of newly created posts.
+
+Each new post is rendered once to an HTML fragment and published on its
+topic's channel; the server-sent events endpoint relays it to connected
+readers. The broker is pluggable (``FORUM_LIVE_BROKER``): the default
+in-process broker only reaches readers connected to the same process, a
+shared broker (Redis pub/sub, PostgreSQL LISTEN/NOTIFY) can implement the
+same two methods for several workers.
+"""
+import asyncio
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    name: str
+    data: str
+
+    def encode(self):
+        lines = ''.join(f'data: {line}\n' for line in self.data.splitlines() or [''])
+        return f'id: {self.id}\nevent: {self.name}\n{lines}\n'
+
+
+def topic_channel(topic_id):
+    return f'topic:{topic_id}'
+
+
+class Subscription:
+    """Events of one channel for one reader, consumed with ``await get()``."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.overflowed = False
+
+    def _put(self, event):
+        # Runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow a reader: end the stream, it will resume with Last-Event-ID
+            self.overflowed = True
+
+    def deliver(self, event):
+        """Hand over an event, from any thread."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout):
+        """Next event, or None after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker:
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def has_subscribers(self, channel):
+        """False only when nobody can be listening, to skip rendering events."""
+        return True
+
+    def subscribe(self, channel):
+        """Return a Subscription; must be called from the event loop."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """Fan-out to the readers connected to this process."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def has_subscribers(self, channel):
+        return bool(self.channels.get(channel))
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.maxsize)
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.channels[subscription.channel]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'FORUM_LIVE_BROKER', 'forum.live.InProcessBroker'))()
+
+
+def post_event(post):
+    html = render_to_string('forum/includes/post.html', {'post': post}).strip()
+    return Event(id=post.pk, name='post', data=html)
+
+
+def publish_post(post):
+    broker, channel = get_broker(), topic_channel(post.topic_id)
+    if broker.has_subscribers(channel):
+        broker.publish(channel, post_event(post))
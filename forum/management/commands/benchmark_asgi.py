@@ -0,0 +1,188 @@
+"""
+Compare WSGI and ASGI throughput with many slow readers.
+
+Under WSGI each worker thread is held until the client has read the whole
+response, so slow clients cap throughput at workers / latency. Under ASGI
+the send is awaited and the worker is free in the meantime. Both servers
+are simulated in process: a thread pool of --workers calling the WSGI
+handler, and --clients concurrent tasks calling the ASGI handler, each
+client taking --delay seconds to receive a response body.
+
+The views served are those of ROOT_URLCONF; run with FORUM_ASYNC_VIEWS=1
+to benchmark the async read views.
+
+With --streams, opens that many topic event streams at each given count
+instead, and fails if the process's thread count grows with them: an
+idle stream must cost a coroutine, not an OS thread.
+"""
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from forum.models import Topic
+
+from .benchmark_views import benchmark_urls
+
+
+def wsgi_environ(url):
+    parts = urlsplit(url)
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def asgi_scope(url):
+    parts = urlsplit(url)
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare WSGI and ASGI request throughput under slow concurrent clients."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4, help="WSGI worker threads.")
+        parser.add_argument('--clients', type=int, default=100, help="Concurrent ASGI clients.")
+        parser.add_argument('--delay', type=float, default=0.2, help="Seconds a client takes to read a response.")
+        parser.add_argument('--streams', help="Comma-separated counts of event streams to hold open instead.")
+
+    def handle(self, *args, **options):
+        if options['streams']:
+            return self.check_streams([int(count) for count in options['streams'].split(',')])
+
+        urls = [url for name, url in benchmark_urls()]
+        urls = [urls[i % len(urls)] for i in range(options['requests'])]
+
+        wsgi = self.run_wsgi(urls, options['workers'], options['delay'])
+        asgi = asyncio.run(self.run_asgi(urls, options['clients'], options['delay']))
+
+        for name, (elapsed, statuses) in [('WSGI', wsgi), ('ASGI', asgi)]:
+            errors = sum(1 for status in statuses if status >= 400)
+            self.stdout.write(
+                f"{name}: {len(urls) / elapsed:8.1f} req/s "
+                f"({len(urls)} requêtes en {elapsed:.2f} s, {errors} erreurs)"
+            )
+
+    def run_wsgi(self, urls, workers, delay):
+        handler = WSGIHandler()
+
+        def request(url):
+            status = []
+            body = handler(wsgi_environ(url), lambda s, headers: status.append(int(s.split()[0])))
+            try:
+                for chunk in body:
+                    time.sleep(delay)
+            finally:
+                body.close()
+            return status[0]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            statuses = list(pool.map(request, urls))
+        return time.perf_counter() - start, statuses
+
+    async def run_asgi(self, urls, clients, delay):
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(clients)
+
+        async def request(url):
+            status = []
+            messages = asyncio.Queue()
+            messages.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+
+            async def receive():
+                # After the body, waits for a disconnect that never comes
+                return await messages.get()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif message['type'] == 'http.response.body':
+                    await asyncio.sleep(delay)
+
+            async with semaphore:
+                await handler(asgi_scope(url), receive, send)
+            return status[0]
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(request(url) for url in urls))
+        return time.perf_counter() - start, statuses
+
+    def check_streams(self, counts):
+        if not settings.FORUM_ASYNC_VIEWS:
+            raise CommandError("Les flux d'événements nécessitent FORUM_ASYNC_VIEWS=1.")
+        topic = Topic.objects.first()
+        if topic is None:
+            raise CommandError("No data to benchmark, run seed_forum first.")
+        url = reverse('forum:topic_events', args=[topic.pk]) + '?after=0'
+
+        threads = [asyncio.run(self.hold_streams(url, count)) for count in counts]
+        for count, total in zip(counts, threads):
+            self.stdout.write(f"{count:6} flux ouverts : {total} threads")
+        # A few pool threads may start on the way, but not one per stream
+        if threads[-1] - threads[0] > max(4, (counts[-1] - counts[0]) // 10):
+            raise CommandError("Le nombre de threads augmente avec le nombre de flux.")
+
+    async def hold_streams(self, url, count):
+        """Open ``count`` streams, return the thread count once all are streaming."""
+        handler = ASGIHandler()
+        streaming = asyncio.Semaphore(0)
+
+        async def stream():
+            messages = asyncio.Queue()
+            messages.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+
+            async def send(message):
+                if message['type'] == 'http.response.body' and message.get('body', b'').startswith(b'retry'):
+                    streaming.release()
+
+            await handler(asgi_scope(url), messages.get, send)
+
+        tasks = [asyncio.create_task(stream()) for _ in range(count)]
+        try:
+            for _ in range(count):
+                await streaming.acquire()
+            # Let the replays finish
+            await asyncio.sleep(0.5)
+            return threading.active_count()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
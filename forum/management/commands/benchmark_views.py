@@ -0,0 +1,157 @@
+"""
+Benchmark the read views on seeded data.
+
+For each data scale, a fresh test database is created and filled with
+seed_forum, then every view is requested repeatedly through the test
+client. p50/p95 latencies and query counts are written as JSON; with
+--baseline the run fails when a view exceeds its query budget or its p95
+regresses by more than --threshold.
+"""
+import io
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from forum.models import Category, Forum, Topic
+
+# Maximum number of SQL queries per request, whatever the data size
+QUERY_BUDGETS = {
+    'index': 6,
+    'category_detail': 4,
+    'forum_detail': 5,
+    'forum_detail (last page)': 5,
+    'forum_detail (?page=N)': 6,
+    'topic_detail': 6,
+    'topic_detail (last page)': 6,
+    'topic_detail (?page=N)': 7,
+    'search': 5,
+}
+
+# Seed parameters at scale 1
+BASE_SCALE = {'categories': 3, 'forums': 4, 'users': 100, 'topics': 500, 'max_posts': 300}
+
+
+def benchmark_urls():
+    """(name, url) pairs for every benchmarked view, on the busiest objects."""
+    category = Category.objects.order_by('order').first()
+    forum = Forum.objects.order_by('-topic_count').first()
+    topic = Topic.objects.order_by('-post_count').first()
+    if not (category and forum and topic):
+        raise CommandError("No data to benchmark, run seed_forum first.")
+    forum_url, topic_url = forum.get_absolute_url(), topic.get_absolute_url()
+    return [
+        ('index', '/'),
+        ('category_detail', category.get_absolute_url()),
+        ('forum_detail', forum_url),
+        ('forum_detail (last page)', f'{forum_url}?cursor=last'),
+        ('forum_detail (?page=N)', f'{forum_url}?page={max(1, forum.topic_count // 20)}'),
+        ('topic_detail', topic_url),
+        ('topic_detail (last page)', f'{topic_url}?cursor=last'),
+        ('topic_detail (?page=N)', f'{topic_url}?page={max(1, topic.post_count // 15)}'),
+        ('search', '/search/?q=château'),
+    ]
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Time the read views at several data scales and check query budgets and regressions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1', help="Comma-separated multipliers of the seed size.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warm-cache', action='store_true', help="Keep the page and fragment caches between requests.")
+        parser.add_argument('--current-db', action='store_true', help="Benchmark the configured database as is.")
+        parser.add_argument('--output', help="Write results as JSON to this file.")
+        parser.add_argument('--baseline', help="JSON file of a previous run to compare against.")
+        parser.add_argument('--threshold', type=float, default=0.25, help="Allowed p95 regression (0.25 = 25%%).")
+
+    def handle(self, *args, **options):
+        results = {}
+        if options['current_db']:
+            results['current'] = self.run_views(options)
+        else:
+            for scale in options['scales'].split(','):
+                results[scale] = self.run_scale(float(scale), options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        failures = self.check_results(results, options)
+        if failures:
+            raise CommandError("Benchmark en échec :\n" + '\n'.join(failures))
+
+    def run_scale(self, scale, options):
+        seed = {name: max(1, int(value * scale)) for name, value in BASE_SCALE.items()}
+        seed['max_posts'] = BASE_SCALE['max_posts']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Échelle {scale} : {seed}"))
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            call_command('seed_forum', stdout=self.stdout if options['verbosity'] > 1 else io.StringIO(), **seed)
+            return self.run_views(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_views(self, options):
+        setup_test_environment()
+        # The repeated requests would trip the search rate limit
+        limits = override_settings(FORUM_RATE_LIMITS={})
+        limits.enable()
+        try:
+            client = Client()
+            results = {}
+            for name, url in benchmark_urls():
+                timings, queries = [], []
+                for _ in range(options['repeat']):
+                    if not options['warm_cache']:
+                        cache.clear()
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        response = client.get(url)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f"{name} ({url}) a répondu {response.status_code}")
+                    queries.append(len(captured))
+                results[name] = {
+                    'p50_ms': round(statistics.median(timings), 2),
+                    'p95_ms': round(percentile(timings, 95), 2),
+                    'queries': max(queries),
+                }
+                self.stdout.write(f"  {name:28} p50 {results[name]['p50_ms']:8.2f} ms   "
+                                  f"p95 {results[name]['p95_ms']:8.2f} ms   {results[name]['queries']} requêtes")
+            return results
+        finally:
+            limits.disable()
+            teardown_test_environment()
+
+    def check_results(self, results, options):
+        failures = []
+        for scale, views in results.items():
+            for name, result in views.items():
+                budget = QUERY_BUDGETS.get(name)
+                if budget is not None and result['queries'] > budget:
+                    failures.append(f"[{scale}] {name} : {result['queries']} requêtes (budget {budget})")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            for scale, views in results.items():
+                for name, result in views.items():
+                    previous = baseline.get(scale, {}).get(name)
+                    if previous and result['p95_ms'] > previous['p95_ms'] * (1 + options['threshold']):
+                        failures.append(
+                            f"[{scale}] {name} : p95 {result['p95_ms']} ms contre {previous['p95_ms']} ms"
+                        )
+        return failures
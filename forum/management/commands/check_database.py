@@ -0,0 +1,56 @@
+"""
+Show the effective database configuration and check it is applied.
+
+On SQLite the pragmas of a live connection are compared with
+FORUM_SQLITE_PRAGMAS; on PostgreSQL the server version and connection
+settings are reported. Exits with an error when something does not match.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = "Show the database settings in effect and check the SQLite pragmas."
+
+    def handle(self, *args, **options):
+        db = connection.settings_dict
+        self.stdout.write(f"Moteur : {connection.vendor} ({db['NAME']})")
+        self.stdout.write(f"CONN_MAX_AGE : {db['CONN_MAX_AGE']}, CONN_HEALTH_CHECKS : {db['CONN_HEALTH_CHECKS']}")
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                self.check_sqlite(cursor)
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SHOW server_version')
+                self.stdout.write(f"PostgreSQL {cursor.fetchone()[0]}")
+                cursor.execute('SHOW max_connections')
+                self.stdout.write(f"max_connections : {cursor.fetchone()[0]}")
+        self.stdout.write(self.style.SUCCESS("Configuration de la base OK."))
+
+    def check_sqlite(self, cursor):
+        errors = []
+        for name, expected in settings.FORUM_SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}')
+            value = cursor.fetchone()[0]
+            self.stdout.write(f"PRAGMA {name} = {value}")
+            if not self.matches(name, value, expected):
+                errors.append(f"{name} = {value} (attendu : {expected})")
+        if errors:
+            raise CommandError("Pragmas non appliqués : " + ", ".join(errors))
+
+    @staticmethod
+    def matches(name, value, expected):
+        # SQLite reports enums as integers, except journal_mode
+        names = {
+            'synchronous': ['off', 'normal', 'full', 'extra'],
+            'temp_store': ['default', 'file', 'memory'],
+            'foreign_keys': ['off', 'on'],
+        }
+        expected = str(expected).lower()
+        if name in names and expected in names[name]:
+            expected = str(names[name].index(expected))
+        # In-memory databases cannot use WAL
+        if name == 'journal_mode' and str(value).lower() == 'memory':
+            return True
+        return str(value).lower() == expected
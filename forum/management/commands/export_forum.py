@@ -0,0 +1,37 @@
+"""
+Export the board as JSON Lines or CSV, in the format import_forum reads.
+"""
+import os
+import sys
+
+from django.core.management.base import BaseCommand
+
+from forum.bulk import export_records, write_csv, write_jsonl
+
+
+class Command(BaseCommand):
+    help = "Stream categories, forums, members, topics and posts to JSON Lines or CSV files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="JSON Lines file ('-' for stdout), or a directory with --format csv.")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per query.")
+
+    def handle(self, *args, **options):
+        records = export_records(chunk_size=options['chunk_size'])
+        output = options['output']
+
+        if options['format'] == 'csv':
+            os.makedirs(output, exist_ok=True)
+            names = {'category': 'categories'}
+            count = write_csv(records, lambda record_type: open(
+                os.path.join(output, f"{names.get(record_type, record_type + 's')}.csv"), 'w',
+                encoding='utf-8', newline='',
+            ))
+        elif output == '-':
+            count = write_jsonl(records, sys.stdout)
+        else:
+            with open(output, 'w', encoding='utf-8') as file:
+                count = write_jsonl(records, file)
+
+        self.stderr.write(self.style.SUCCESS(f"{count} enregistrements exportés."))
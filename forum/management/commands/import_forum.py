@@ -0,0 +1,63 @@
+"""
+Import a legacy board from JSON Lines or CSV files (see forum.bulk).
+
+    manage.py import_forum board.jsonl
+    manage.py import_forum categories.csv forums.csv users.csv topics.csv posts.csv
+
+Run the same command again to resume an interrupted import.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from forum import routing
+from forum.bulk import BulkImportError, Importer, read
+
+
+class Command(BaseCommand):
+    help = "Bulk-import categories, forums, members, topics and posts from JSON Lines or CSV files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="Files in dependency order (parents first).")
+        parser.add_argument('--name', help="Import name for checkpoints and id maps (default: the file names).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT.")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Records per transaction.")
+        parser.add_argument('--workers', type=int, default=None, help="Markdown rendering processes (default: CPU count).")
+        parser.add_argument('--skip-maintenance', action='store_true', help="Do not rebuild counters and search index.")
+
+    def handle(self, *args, **options):
+        for path in options['files']:
+            if not os.path.exists(path):
+                raise CommandError(f"Fichier introuvable : {path}")
+        name = options['name'] or ','.join(os.path.basename(path) for path in options['files'])
+        workers = options['workers'] or os.cpu_count() or 1
+
+        # Fresh interpreters: forked children would share the parent's DB connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+            importer = Importer(
+                name, batch_size=options['batch_size'], chunk_size=options['chunk_size'],
+                pool=pool if workers > 1 else None, log=self.stdout.write,
+            )
+            try:
+                for path in options['files']:
+                    importer.run(os.path.abspath(path), read(path))
+            except BulkImportError as exc:
+                raise CommandError(str(exc))
+            finally:
+                # bulk_create sends no signals
+                routing.invalidate()
+
+        for record_type, count in importer.counts.items():
+            skipped = importer.skipped[record_type]
+            self.stdout.write(f"{record_type} : {count} importés" + (f", {skipped} ignorés" if skipped else ""))
+
+        if not options['skip_maintenance']:
+            for command in ('recount_forum_stats', 'reconcile_profile_counters', 'reconcile_site_stats',
+                            'rebuild_search_index'):
+                call_command(command, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Import terminé."))
@@ -0,0 +1,53 @@
+"""
+Generate the cleaned avatars and thumbnails of existing profiles.
+
+Runs the same work as the process_avatar job, across a process pool since
+image resizing is CPU-bound.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from forum import tasks
+from forum.models import UserProfile
+
+
+def process(args):
+    profile_id, name, force = args
+    try:
+        tasks.process_avatar(profile_id, name, force=force)
+    except Exception as exc:
+        return profile_id, f'{type(exc).__name__}: {exc}'
+    return profile_id, None
+
+
+class Command(BaseCommand):
+    help = "Process avatars that have no thumbnails yet (or all with --all)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Regenerate the thumbnails of every avatar.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count).")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['all']:
+            profiles = profiles.filter(avatar_version='')
+        work = [(pk, name, options['all']) for pk, name in profiles.values_list('pk', 'avatar')]
+        if not work:
+            self.stdout.write("Aucun avatar à traiter.")
+            return
+
+        workers = options['workers'] or os.cpu_count() or 1
+        connections.close_all()
+        failed = 0
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+            for profile_id, error in pool.map(process, work, chunksize=max(1, len(work) // (4 * workers))):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Profil {profile_id} : {error}")
+        self.stdout.write(self.style.SUCCESS(f"{len(work) - failed} avatars traités, {failed} en échec."))
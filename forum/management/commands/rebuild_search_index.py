@@ -0,0 +1,16 @@
+"""
+Rebuild the full-text search index from scratch.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from forum.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Reindex every topic title and post content."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Index de recherche reconstruit ({type(backend).__name__})."))
@@ -0,0 +1,30 @@
+"""
+Rebuild the post and topic counters of every member profile.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from forum.models import Topic, Post, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Recount posts and topics per member with grouped aggregates and fix drifted profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        post_counts = dict(Post.objects.order_by().values_list('author').annotate(total=Count('pk')))
+        topic_counts = dict(Topic.objects.order_by().values_list('author').annotate(total=Count('pk')))
+
+        drifted = []
+        for profile in UserProfile.objects.only('pk', 'user_id', 'post_count', 'topic_count').iterator():
+            post_count = post_counts.get(profile.user_id, 0)
+            topic_count = topic_counts.get(profile.user_id, 0)
+            if (profile.post_count, profile.topic_count) != (post_count, topic_count):
+                profile.post_count, profile.topic_count = post_count, topic_count
+                drifted.append(profile)
+
+        with transaction.atomic():
+            UserProfile.objects.bulk_update(drifted, ['post_count', 'topic_count'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} profil(s) corrigé(s)."))
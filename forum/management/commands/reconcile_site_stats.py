@@ -0,0 +1,14 @@
+"""
+Recount the site-wide totals shown on the homepage.
+"""
+from django.core.management.base import BaseCommand
+from forum.models import SiteStats
+
+
+class Command(BaseCommand):
+    help = "Recount topics, posts and members from scratch."
+
+    def handle(self, *args, **options):
+        stats, _ = SiteStats.objects.get_or_create(pk=1)
+        stats.reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Statistiques recalculées : {stats.as_dict()}"))
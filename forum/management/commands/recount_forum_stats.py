@@ -0,0 +1,16 @@
+"""
+Rebuild the denormalized topic and forum counters.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from forum.models import Forum, Topic
+
+
+class Command(BaseCommand):
+    help = "Recompute post/topic counts and last post pointers for every topic and forum."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            topics = Topic.objects.update(**Topic.stats_expressions())
+            forums = Forum.objects.update(**Forum.stats_expressions())
+        self.stdout.write(self.style.SUCCESS(f"{topics} sujets et {forums} forums recalculés."))
@@ -0,0 +1,58 @@
+"""
+Backfill the pre-rendered HTML of posts across a process pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from forum.models import Post
+from forum.rendering import get_renderer_config, get_renderer_version, render_markdown
+
+
+class Command(BaseCommand):
+    help = "Render Markdown to HTML for posts whose stored HTML is missing or stale."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-render every post, not only stale ones.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count).")
+
+    def handle(self, *args, **options):
+        version = get_renderer_version()
+        render = partial(render_markdown, config=get_renderer_config())
+        posts = Post.objects.order_by('pk')
+        if not options['all']:
+            posts = posts.exclude(content_html_version=version)
+
+        batch_size = options['batch_size']
+        workers = options['workers'] or os.cpu_count() or 1
+        chunksize = max(1, batch_size // (4 * workers))
+        rendered = 0
+        last_pk = 0
+        # Fresh interpreters: forked children would share the parent's DB connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+            while True:
+                # Keyset batches: rows rendered so far drop out of a stale-only filter
+                batch = list(posts.filter(pk__gt=last_pk).only('pk', 'content')[:batch_size])
+                if not batch:
+                    break
+                rendered_html = pool.map(render, [post.content for post in batch], chunksize=chunksize)
+                rows = [(html, version, post.pk, post.content) for post, html in zip(batch, rendered_html)]
+                # executemany of a plain UPDATE is much cheaper than bulk_update's CASE WHEN;
+                # posts edited meanwhile keep their newer HTML
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(
+                        f'UPDATE {Post._meta.db_table} SET content_html = %s, content_html_version = %s '
+                        f'WHERE id = %s AND content = %s',
+                        rows,
+                    )
+                rendered += len(batch)
+                last_pk = batch[-1].pk
+                self.stdout.write(f"{rendered} messages rendus...")
+
+        self.stdout.write(self.style.SUCCESS(f"{rendered} messages rendus (version {version})."))
@@ -0,0 +1,66 @@
+"""
+Run queued background jobs.
+
+Claims due jobs in batches and runs them on a pool of threads (default) or
+processes. Several workers can run side by side, on one or more machines.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from forum import jobs
+from forum.routers import primary
+
+
+def run_in_thread(job):
+    try:
+        return jobs.run(job)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the job table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--processes', action='store_true', help="Use processes instead of threads (CPU-bound jobs).")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due.")
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--keep-days', type=int, default=7, help="Delete finished jobs older than this.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if options['processes']:
+            # Fresh interpreters: forked children would share the parent's DB connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+            target = jobs.run
+        else:
+            pool = ThreadPoolExecutor(workers)
+            target = run_in_thread
+
+        worker = jobs.worker_id()
+        done = failed = 0
+        self.stdout.write(f"Worker {worker} démarré ({workers} {'processus' if options['processes'] else 'threads'}).")
+        try:
+            with pool, primary():
+                while True:
+                    jobs.requeue_stale()
+                    batch = jobs.claim(workers * 2, worker)
+                    if not batch:
+                        jobs.purge(options['keep_days'])
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    for ok in pool.map(target, batch):
+                        done += ok
+                        failed += not ok
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"{done} tâches réussies, {failed} en échec."))
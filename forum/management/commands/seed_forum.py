@@ -0,0 +1,118 @@
+"""
+Generate a large, realistic forum for load tests and benchmarks.
+
+Topics per forum and posts per topic follow a Zipf distribution, so a few
+forums and megathreads get most of the traffic, like on a real board.
+Rows are inserted with bulk_create, which skips signals, so the
+denormalized counters, search index and rendered HTML are rebuilt at the
+end with the regular maintenance commands.
+"""
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import slugify
+from forum import routing
+from forum.models import Category, Forum, Topic, Post, UserProfile
+
+WORDS = (
+    "forum sujet message réponse question idée projet jeu construction château "
+    "pierre bois serveur mise à jour version problème solution merci bonjour "
+    "tutoriel astuce communauté membre discussion minecraft python django code"
+).split()
+
+
+def zipf_sizes(total, buckets, exponent, rng):
+    """Split ``total`` items over ``buckets`` with Zipf-distributed sizes."""
+    weights = [1 / (rank ** exponent) for rank in range(1, buckets + 1)]
+    rng.shuffle(weights)
+    sizes = [0] * buckets
+    for bucket in rng.choices(range(buckets), weights=weights, k=total):
+        sizes[bucket] += 1
+    return sizes
+
+
+def zipf_sample(maximum, exponent, rng):
+    """One value in 1..maximum, small values being the most frequent."""
+    return rng.choices(range(1, maximum + 1), weights=[1 / (k ** exponent) for k in range(1, maximum + 1)])[0]
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate categories, forums, members, topics and posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--forums', type=int, default=4, help="Forums per category.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--topics', type=int, default=2000, help="Total topics, Zipf-distributed over forums.")
+        parser.add_argument('--max-posts', type=int, default=500, help="Largest number of posts in a topic.")
+        parser.add_argument('--exponent', type=float, default=1.2, help="Zipf exponent.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        prefix = f"seed{rng.randrange(10 ** 6)}"
+
+        categories = Category.objects.bulk_create([
+            Category(name=f"{prefix} catégorie {i}", slug=f"{prefix}-categorie-{i}", order=i)
+            for i in range(options['categories'])
+        ])
+        forums = Forum.objects.bulk_create([
+            Forum(category=category, name=f"Forum {j}", slug=f"forum-{j}", order=j)
+            for category in categories for j in range(options['forums'])
+        ])
+        # bulk_create sends no signals
+        routing.invalidate()
+
+        password = make_password('password')
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}_membre_{i}", email=f"{prefix}_{i}@example.com", password=password)
+            for i in range(options['users'])
+        ], batch_size=batch_size)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users], batch_size=batch_size)
+        self.stdout.write(f"{len(categories)} catégories, {len(forums)} forums, {len(users)} membres.")
+
+        topics_per_forum = zipf_sizes(options['topics'], len(forums), options['exponent'], rng)
+        topic_rows = (
+            Topic(forum=forum, title=title, slug=slugify(title), author=rng.choice(users))
+            for forum, count in zip(forums, topics_per_forum)
+            for title in (self.sentence(rng, 6).capitalize() for _ in range(count))
+        )
+        total_posts = 0
+        for batch in self.batched(topic_rows, batch_size):
+            with transaction.atomic():
+                topics = Topic.objects.bulk_create(batch)
+                posts = (
+                    self.post(topic, rng.choice(users), rng)
+                    for topic in topics
+                    for _ in range(zipf_sample(options['max_posts'], options['exponent'], rng))
+                )
+                for post_batch in self.batched(posts, batch_size):
+                    Post.objects.bulk_create(post_batch)
+                    total_posts += len(post_batch)
+            self.stdout.write(f"{total_posts} messages...")
+
+        for command in ('recount_forum_stats', 'reconcile_profile_counters', 'reconcile_site_stats',
+                        'rebuild_search_index', 'render_posts'):
+            call_command(command, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"{options['topics']} sujets et {total_posts} messages créés."))
+
+    @staticmethod
+    def sentence(rng, length):
+        return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+    def post(self, topic, author, rng):
+        content = '\n\n'.join(self.sentence(rng, rng.randint(8, 40)) for _ in range(rng.randint(1, 4)))
+        return Post(topic=topic, author=author, content=content)
+
+    @staticmethod
+    def batched(iterable, size):
+        iterator = iter(iterable)
+        while batch := list(itertools.islice(iterator, size)):
+            yield batch
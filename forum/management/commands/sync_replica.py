@@ -0,0 +1,46 @@
+"""
+Copy the SQLite primary database to its replica files.
+
+Stands in for replication when trying read replicas locally, e.g.
+``DB_REPLICAS=replica.sqlite3``. Run it again (or with --interval) to
+catch up; the gap between runs behaves like replication lag.
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary database to the replica databases."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help="Keep copying every N seconds.")
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("sync_replica ne fonctionne qu'avec SQLite ; utilisez la réplication du serveur.")
+        if not settings.FORUM_REPLICAS:
+            raise CommandError("Aucun réplica configuré (DB_REPLICAS).")
+
+        while True:
+            self.sync()
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self):
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        try:
+            for alias in settings.FORUM_REPLICAS:
+                connections[alias].close()
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{alias} synchronisé.")
+        finally:
+            source.close()
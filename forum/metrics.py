@@ -0,0 +1,262 @@
+"""
+In-process metrics registry with a Prometheus text endpoint.
+
+Disabled unless ``FORUM_METRICS`` is set, in which case every update is a
+dict increment under a lock. With several worker processes, set
+``FORUM_METRICS_DIR``: each process then snapshots its metrics to
+``<dir>/<pid>-<start>.json`` at most every ``FORUM_METRICS_FLUSH_INTERVAL``
+seconds, and ``/metrics`` sums the snapshots of all processes. Snapshots of
+processes that have exited are folded into ``<dir>/dead.json`` on
+collection, so the sums never go backwards, even when a pid is reused.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def enabled():
+    return getattr(settings, 'FORUM_METRICS', False)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        registry.changed()
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def samples(self, values):
+        for key, value in values.items():
+            yield self.name, key, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with registry.lock:
+            # Per-bucket counts (+Inf last), then sum and count
+            state = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0, 0])
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+        registry.changed()
+
+    @staticmethod
+    def merge(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def samples(self, values):
+        for key, state in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state):
+                cumulative += count
+                yield f'{self.name}_bucket', key + (('le', str(bound)),), cumulative
+            yield f'{self.name}_sum', key, state[-2]
+            yield f'{self.name}_count', key, state[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._last_flush = 0.0
+        self._pid = self._started = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    @property
+    def directory(self):
+        directory = getattr(settings, 'FORUM_METRICS_DIR', None)
+        return Path(directory) if directory else None
+
+    def changed(self):
+        interval = getattr(settings, 'FORUM_METRICS_FLUSH_INTERVAL', 1.0)
+        if self.directory is not None and time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {json.dumps(key): list(value) if isinstance(value, list) else value
+                       for key, value in metric.values.items()}
+                for name, metric in self.metrics.items()
+            }
+
+    def flush(self):
+        """Write this process's metrics to the shared directory."""
+        directory = self.directory
+        if directory is None:
+            return
+        self._last_flush = time.monotonic()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / self.filename()
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp, path)
+
+    def filename(self):
+        """This process's snapshot file: the pid alone could be reused by a later process."""
+        pid = os.getpid()
+        if pid != self._pid:
+            # New process, or forked from the one that imported this module
+            self._pid, self._started = pid, time.time_ns()
+        return f'{pid}-{self._started}.json'
+
+    def collect(self):
+        """Metric values of all processes (or just this one), merged."""
+        snapshots = [self.snapshot()]
+        directory = self.directory
+        if directory is not None and directory.exists():
+            # Exclusive, so no collection sees a snapshot both folded and not
+            with open(directory / 'dead.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._fold_dead(directory)
+                own = self.filename()
+                for path in directory.glob('*.json'):
+                    if path.name != own:
+                        try:
+                            snapshots.append(json.loads(path.read_text()))
+                        except (OSError, ValueError):
+                            continue
+
+        merged = {}
+        for snapshot in snapshots:
+            self._merge(merged, snapshot)
+        return {
+            name: {tuple(json.loads(key)): value for key, value in values.items()}
+            for name, values in merged.items()
+        }
+
+    def _merge(self, merged, snapshot):
+        for name, values in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            target = merged.setdefault(name, {})
+            for key, value in values.items():
+                target[key] = metric.merge(target[key], value) if key in target else value
+        return merged
+
+    def _fold_dead(self, directory):
+        """Add the snapshots of exited processes to ``dead.json`` and remove them (under the lock)."""
+        by_pid = {}
+        for path in directory.glob('*.json'):
+            pid, _, started = path.stem.partition('-')
+            # <pid>.json: written before snapshots carried a start time
+            if pid.isdigit() and (started.isdigit() or not started):
+                by_pid.setdefault(int(pid), []).append((int(started or 0), path))
+        dead = []
+        for pid, files in by_pid.items():
+            files.sort()
+            # Only the latest process with a pid can still be running
+            dead += [path for _, path in (files[:-1] if _alive(pid) else files)]
+        if not dead:
+            return
+
+        archive = directory / 'dead.json'
+        try:
+            merged = json.loads(archive.read_text())
+        except (OSError, ValueError):
+            merged = {}
+        for path in dead:
+            try:
+                self._merge(merged, json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        tmp = archive.with_suffix('.tmp')
+        tmp.write_text(json.dumps(merged))
+        os.replace(tmp, archive)
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+    def exposition(self):
+        lines = []
+        merged = self.collect()
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for sample, key, value in metric.samples(merged.get(name, {})):
+                labels = list(zip(metric.labelnames, key[:len(metric.labelnames)])) + list(key[len(metric.labelnames):])
+                rendered = ','.join('%s="%s"' % (label, _escape(str(v))) for label, v in labels)
+                lines.append(f'{sample}{{{rendered}}} {value}' if rendered else f'{sample} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+request_duration = registry.register(Histogram(
+    'forum_request_duration_seconds', "Request latency by URL name.", ['view'],
+))
+db_queries = registry.register(Counter(
+    'forum_db_queries_total', "SQL queries issued, by URL name.", ['view'],
+))
+cache_requests = registry.register(Counter(
+    'forum_cache_requests_total', "Cache lookups by cache and result (hit/miss).", ['cache', 'result'],
+))
+posts_created = registry.register(Counter('forum_posts_created_total', "Posts created."))
+topics_created = registry.register(Counter('forum_topics_created_total', "Topics created."))
+search_duration = registry.register(Histogram('forum_search_duration_seconds', "Search latency."))
+logins = registry.register(Counter('forum_logins_total', "Login attempts by result.", ['result']))
+rate_limited = registry.register(Counter('forum_rate_limited_total', "Requests refused with 429.", ['view']))
+
+
+def metrics_view(request):
+    if not enabled():
+        return HttpResponse(status=404)
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,409 @@
+"""
+Opt-in middleware: request profiling, metrics, static files, replica
+pinning and rate limiting.
+
+ProfilingMiddleware:
+
+Enabled with ``FORUM_PROFILING = True``. For every request it measures the
+SQL queries (count, time, repeated statements), template rendering,
+Markdown rendering and total time, reports them in a ``Server-Timing``
+header and logs requests slower than ``FORUM_SLOW_REQUEST_MS``. A sample
+of requests (``FORUM_PROFILING_SAMPLE_RATE``) also runs under cProfile,
+and the stats of the slow ones are dumped to ``FORUM_PROFILING_DIR``.
+
+MetricsMiddleware:
+Enabled with ``FORUM_METRICS = True``. Records latency and query counts
+per URL name in the metrics registry served at ``/metrics``.
+
+StaticFilesMiddleware:
+Enabled with ``FORUM_STATIC_SERVE`` (default when DEBUG is off). Serves
+``collectstatic`` output from STATIC_ROOT ahead of the rest of the stack,
+preferring the pre-compressed ``.br``/``.gz`` copies, with a one-year
+immutable Cache-Control on content-hashed names.
+
+ReplicaPinMiddleware:
+Enabled when ``FORUM_REPLICAS`` is set. Write requests (POST, ...) read
+from the primary and set a cookie that keeps the user's reads on the
+primary for ``FORUM_REPLICA_PIN_SECONDS``.
+
+RateLimitMiddleware:
+Enabled when ``FORUM_RATE_LIMITS`` is set. Counts requests to the listed
+URL names per IP, user or submitted field and answers 429 with
+``Retry-After`` over the limit (see forum/ratelimit.py).
+
+All of them are async capable: a sync-only middleware would make Django
+run the whole ASGI chain in the request's thread-sensitive executor, one
+OS thread per open request, long-lived event streams included. Under ASGI
+the SQL of a request runs in that executor's thread, so query capture
+hooks its connections there; cProfile sampling only covers WSGI requests.
+"""
+import cProfile
+import json
+import logging
+import mimetypes
+import os
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.template.backends.django import Template
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.utils.module_loading import import_string
+
+from . import metrics, profiling, ratelimit
+from .routers import primary
+
+logger = logging.getLogger('forum.profiling')
+
+
+def _wrap_connections(wrapper):
+    """Install ``wrapper`` on every database alias of this thread; close the returned stack to remove it."""
+    # Every alias, so replica reads are counted too
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+@asynccontextmanager
+async def _awrap_connections(wrapper):
+    # Connections are per thread: the request's ORM calls run in its thread-sensitive executor
+    stack = await sync_to_async(_wrap_connections)(wrapper)
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware with a sync ``__call__`` and an async ``__acall__``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+def _patch_template_render():
+    """Time every Django template render, like Django's test instrumentation does."""
+    if getattr(Template.render, 'profiled', False):
+        return
+    original = Template.render
+
+    def render(self, *args, **kwargs):
+        with profiling.timed('template'):
+            return original(self, *args, **kwargs)
+
+    render.profiled = True
+    Template.render = render
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        if not getattr(settings, 'FORUM_PROFILING', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.slow_ms = getattr(settings, 'FORUM_SLOW_REQUEST_MS', 500)
+        self.sample_rate = getattr(settings, 'FORUM_PROFILING_SAMPLE_RATE', 0.0)
+        self.duplicate_threshold = getattr(settings, 'FORUM_PROFILING_DUPLICATE_THRESHOLD', 3)
+        self.profile_dir = Path(getattr(settings, 'FORUM_PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        _patch_template_render()
+
+    def handle(self, request):
+        profile = profiling.RequestProfile()
+        token = profiling.current.set(profile)
+        profiler = cProfile.Profile() if random.random() < self.sample_rate else None
+        start = time.perf_counter()
+        try:
+            with _wrap_connections(self._query_recorder(profile)):
+                if profiler is not None:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            profiling.current.reset(token)
+        return self._finish(request, response, profile, time.perf_counter() - start, profiler)
+
+    async def __acall__(self, request):
+        profile = profiling.RequestProfile()
+        token = profiling.current.set(profile)
+        start = time.perf_counter()
+        try:
+            async with _awrap_connections(self._query_recorder(profile)):
+                response = await self.get_response(request)
+        finally:
+            profiling.current.reset(token)
+        return self._finish(request, response, profile, time.perf_counter() - start, None)
+
+    def _finish(self, request, response, profile, total, profiler):
+        report = self._report(request, response, profile, total)
+        response.headers['Server-Timing'] = self._server_timing(profile, total)
+        if report['total_ms'] >= self.slow_ms:
+            logger.warning("Slow request %s", json.dumps(report))
+            if profiler is not None:
+                self._dump(profiler, request)
+        return response
+
+    @staticmethod
+    def _query_recorder(profile):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                profile.queries.append((sql, time.perf_counter() - start))
+        return wrapper
+
+    def _report(self, request, response, profile, total):
+        fingerprints = Counter(sql for sql, _ in profile.queries)
+        match = request.resolver_match
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(sum(duration for _, duration in profile.queries) * 1000, 2),
+            'queries': len(profile.queries),
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in fingerprints.most_common()
+                if count >= self.duplicate_threshold
+            ],
+            **{f'{name}_ms': round(duration * 1000, 2) for name, duration in profile.timings.items()},
+        }
+
+    @staticmethod
+    def _server_timing(profile, total):
+        sql = sum(duration for _, duration in profile.queries)
+        metrics = [f'sql;dur={sql * 1000:.2f};desc="{len(profile.queries)} queries"']
+        metrics += [f'{name};dur={duration * 1000:.2f}' for name, duration in profile.timings.items()]
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+    def _dump(self, profiler, request):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        name = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        path = self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{name.replace(':', '-')}.prof"
+        profiler.dump_stats(path)
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        if not metrics.enabled():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        queries = [0]
+        start = time.perf_counter()
+        with _wrap_connections(self._query_counter(queries)):
+            response = self.get_response(request)
+        self._record(request, time.perf_counter() - start, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        start = time.perf_counter()
+        async with _awrap_connections(self._query_counter(queries)):
+            response = await self.get_response(request)
+        self._record(request, time.perf_counter() - start, queries[0])
+        return response
+
+    @staticmethod
+    def _query_counter(queries):
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+        return count
+
+    @staticmethod
+    def _record(request, duration, queries):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.request_duration.observe(duration, view=view)
+        metrics.db_queries.inc(queries, view=view)
+
+
+class ReplicaPinMiddleware(AsyncCapableMiddleware):
+    cookie_name = 'forum_primary'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FORUM_REPLICAS', None):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.pin_seconds = getattr(settings, 'FORUM_REPLICA_PIN_SECONDS', 10)
+
+    def handle(self, request):
+        if not self._pinned(request):
+            return self.get_response(request)
+        with primary():
+            response = self.get_response(request)
+        return self._pin(request, response)
+
+    async def __acall__(self, request):
+        # primary() is a context variable, seen by the sync_to_async ORM calls too
+        if not self._pinned(request):
+            return await self.get_response(request)
+        with primary():
+            response = await self.get_response(request)
+        return self._pin(request, response)
+
+    def _pinned(self, request):
+        return request.method not in self.safe_methods or self.cookie_name in request.COOKIES
+
+    def _pin(self, request, response):
+        if request.method not in self.safe_methods:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class RateLimitMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        limits = getattr(settings, 'FORUM_RATE_LIMITS', None)
+        if not limits:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        backend = import_string(getattr(settings, 'FORUM_RATE_LIMIT_BACKEND', 'forum.ratelimit.LocalBackend'))
+        self.limiter = ratelimit.RateLimiter(limits, backend())
+        if iscoroutinefunction(self):
+            self.process_view = self.aprocess_view
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = request.resolver_match.view_name
+        wait = self.limiter.check(request, view)
+        return None if wait is None else self._too_many_requests(view, wait)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        view = request.resolver_match.view_name
+        # Unlimited views (e.g. event streams) never touch a thread
+        if view not in self.limiter.rules:
+            return None
+        # request.user may need the database
+        wait = await sync_to_async(self.limiter.check)(request, view)
+        return None if wait is None else self._too_many_requests(view, wait)
+
+    @staticmethod
+    def _too_many_requests(view, wait):
+        metrics.rate_limited.inc(view=view)
+        response = HttpResponse(
+            f"Trop de requêtes. Réessayez dans {wait} secondes.",
+            status=429, content_type='text/plain; charset=utf-8',
+        )
+        response['Retry-After'] = str(wait)
+        return response
+
+
+class StaticFilesMiddleware(AsyncCapableMiddleware):
+    # Preferred first
+    encodings = [('br', '.br'), ('gzip', '.gz')]
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FORUM_STATIC_SERVE', not settings.DEBUG) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.max_age = getattr(settings, 'FORUM_STATIC_MAX_AGE', 60)
+        self.files = self._scan(str(settings.STATIC_ROOT))
+
+    def _scan(self, root):
+        """Index STATIC_ROOT once: files do not change until the next deploy."""
+        manifest = os.path.join(root, 'staticfiles.json')
+        hashed = set()
+        if os.path.exists(manifest):
+            with open(manifest) as file:
+                hashed = set(json.load(file).get('paths', {}).values())
+
+        files = {}
+        for directory, _, names in os.walk(root):
+            for filename in names:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name.endswith(('.gz', '.br')) and os.path.exists(path[:-3]):
+                    continue
+                stat = os.stat(path)
+                tag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+                files[self.prefix + name] = {
+                    'path': path,
+                    'content_type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                    'etag': quote_etag(tag),
+                    'last_modified': http_date(stat.st_mtime),
+                    'immutable': name in hashed,
+                    # A strong ETag names exact bytes, so one per encoding: "<tag>-br", "<tag>-gz"
+                    'encodings': [
+                        (encoding, path + ext, quote_etag(f'{tag}-{ext[1:]}'))
+                        for encoding, ext in self.encodings if os.path.exists(path + ext)
+                    ],
+                }
+        return files
+
+    def handle(self, request):
+        file = self._lookup(request)
+        if file is None:
+            return self.get_response(request)
+        return self._serve(request, file)
+
+    async def __acall__(self, request):
+        file = self._lookup(request)
+        if file is None:
+            return await self.get_response(request)
+        return self._serve(request, file)
+
+    def _lookup(self, request):
+        return self.files.get(request.path_info) if request.method in ('GET', 'HEAD') else None
+
+    def _serve(self, request, file):
+        accepted = self._accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding, path, etag = next(
+            (variant for variant in file['encodings'] if variant[0] in accepted),
+            (None, file['path'], file['etag']),
+        )
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=file['content_type'])
+            # FileResponse names the .br/.gz file
+            del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = file['last_modified']
+        response['ETag'] = etag
+        if file['encodings']:
+            response['Vary'] = 'Accept-Encoding'
+        if file['immutable']:
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={self.max_age}'
+        return response
+
+    @staticmethod
+    def _accepted_encodings(header):
+        accepted = set()
+        for item in header.split(','):
+            encoding, _, params = item.strip().partition(';')
+            if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                accepted.add(encoding.strip().lower())
+        return accepted
@@ -0,0 +1,78 @@
+# Generated by Django 5.0 on 2026-10-18 07:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_stats(apps, schema_editor):
+    Forum = apps.get_model('forum', 'Forum')
+    Topic = apps.get_model('forum', 'Topic')
+    Post = apps.get_model('forum', 'Post')
+
+    def count(queryset, group_by):
+        return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')), 0)
+
+    def latest(posts, field):
+        return Subquery(posts.order_by('-created_at', '-pk').values(field)[:1])
+
+    posts = Post.objects.filter(topic=OuterRef('pk'))
+    Topic.objects.update(
+        post_count=count(posts, 'topic'),
+        last_post=latest(posts, 'pk'),
+        last_post_at=latest(posts, 'created_at'),
+    )
+    posts = Post.objects.filter(topic__forum=OuterRef('pk'))
+    Forum.objects.update(
+        topic_count=count(Topic.objects.filter(forum=OuterRef('pk')), 'forum'),
+        post_count=count(posts, 'topic__forum'),
+        last_post=latest(posts, 'pk'),
+        last_post_at=latest(posts, 'created_at'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forum',
+            name='last_post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum.post'),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='topic_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='last_post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum.post'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS forum_search USING fts5("
+        "title, content, topic_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO forum_search (rowid, title, content, topic_id) "
+        "SELECT -id, title, '', id FROM forum_topic"
+    )
+    schema_editor.execute(
+        "INSERT INTO forum_search (rowid, title, content, topic_id) "
+        "SELECT id, '', content, topic_id FROM forum_post"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS forum_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0002_denormalized_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
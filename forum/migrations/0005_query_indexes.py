@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 07:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_post_content_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['topic', 'created_at'], name='post_topic_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['forum', '-is_pinned', '-is_announced', '-updated_at', 'id'], name='topic_forum_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['author', 'created_at'], name='topic_author_created_idx'),
+        ),
+        # "Latest member" on the homepage; auth.User is not ours to add Meta.indexes to
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS user_date_joined_idx ON auth_user (date_joined)',
+            'DROP INDEX IF EXISTS user_date_joined_idx',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 07:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Topic = apps.get_model('forum', 'Topic')
+    Post = apps.get_model('forum', 'Post')
+    UserProfile = apps.get_model('forum', 'UserProfile')
+
+    def count(model):
+        rows = model.objects.filter(author=OuterRef('user')).order_by().values('author').annotate(total=Count('pk'))
+        return Coalesce(Subquery(rows.values('total')), 0)
+
+    UserProfile.objects.update(post_count=count(Post), topic_count=count(Topic))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0006_site_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='topic_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_version',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+    ]
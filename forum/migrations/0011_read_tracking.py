@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-18 08:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0010_bulk_import'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForumReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marked_at', models.DateTimeField(help_text='Watermark: topics updated until then are read')),
+                ('topics', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['forum', 'updated_at'], name='topic_forum_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='forumreadstate',
+            name='forum',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='forum.forum'),
+        ),
+        migrations.AddField(
+            model_name='forumreadstate',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forum_read_states', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='forumreadstate',
+            constraint=models.UniqueConstraint(fields=('user', 'forum'), name='forum_read_state_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0012_job_active_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_uploaded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
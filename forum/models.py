@@ -1,11 +1,33 @@
 """
 Forum models following Django MVC pattern.
 """
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.templatetags.static import static
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from markdownx.models import MarkdownxField
+from . import avatars, routing
+from .counters import view_counter
+from .rendering import get_renderer_version, render_markdown
+
+
+def _count_subquery(queryset, group_by):
+    """COUNT(*) of a correlated queryset as a scalar subquery."""
+    counted = queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted), 0)
+
+
+def _last_post_subquery(posts, field):
+    """A field of the most recent post of a correlated queryset."""
+    return Subquery(posts.order_by('-created_at', '-pk').values(field)[:1])
 
 
 class Category(models.Model):
@@ -34,10 +56,10 @@ class Category(models.Model):
         return reverse('forum:category_detail', kwargs={'slug': self.slug})
 
     def get_topics_count(self):
-        return Topic.objects.filter(forum__category=self).count()
+        return sum(forum.topic_count for forum in self.forums.all())
 
     def get_posts_count(self):
-        return Post.objects.filter(topic__forum__category=self).count()
+        return sum(forum.post_count for forum in self.forums.all())
 
 
 class Forum(models.Model):
@@ -49,6 +71,10 @@ class Forum(models.Model):
     icon = models.CharField(max_length=50, default='💬', help_text="Emoji or icon class")
     order = models.IntegerField(default=0)
     is_locked = models.BooleanField(default=False)
+    topic_count = models.IntegerField(default=0)
+    post_count = models.IntegerField(default=0)
+    last_post = models.ForeignKey('Post', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_post_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -65,16 +91,32 @@ class Forum(models.Model):
         return f"{self.category.name} - {self.name}"
 
     def get_absolute_url(self):
-        return reverse('forum:forum_detail', kwargs={'category_slug': self.category.slug, 'forum_slug': self.slug})
+        return routing.forum_url(self.pk) or reverse('forum:forum_detail', kwargs={
+            'category_slug': self.category.slug, 'forum_slug': self.slug,
+        })
 
     def get_topics_count(self):
-        return self.topics.count()
+        return self.topic_count
 
     def get_posts_count(self):
-        return Post.objects.filter(topic__forum=self).count()
+        return self.post_count
 
     def get_last_post(self):
-        return Post.objects.filter(topic__forum=self).select_related('author', 'topic').order_by('-created_at').first()
+        return self.last_post
+
+    @staticmethod
+    def stats_expressions():
+        """Subqueries recomputing the denormalized counters, for use in update()."""
+        posts = Post.objects.filter(topic__forum=OuterRef('pk'))
+        return {
+            'topic_count': _count_subquery(Topic.objects.filter(forum=OuterRef('pk')), 'forum'),
+            'post_count': _count_subquery(posts, 'topic__forum'),
+            'last_post': _last_post_subquery(posts, 'pk'),
+            'last_post_at': _last_post_subquery(posts, 'created_at'),
+        }
+
+    def update_stats(self):
+        Forum.objects.filter(pk=self.pk).update(**Forum.stats_expressions())
 
 
 class Topic(models.Model):
@@ -87,11 +129,22 @@ class Topic(models.Model):
     is_locked = models.BooleanField(default=False)
     is_announced = models.BooleanField(default=False)
     views = models.IntegerField(default=0)
+    post_count = models.IntegerField(default=0)
+    last_post = models.ForeignKey('Post', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_post_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-is_pinned', '-is_announced', '-updated_at']
+        indexes = [
+            # Topic listing of forum_detail, in keyset order
+            models.Index(fields=['forum', '-is_pinned', '-is_announced', '-updated_at', 'id'], name='topic_forum_listing_idx'),
+            # Latest topics on a member profile
+            models.Index(fields=['author', 'created_at'], name='topic_author_created_idx'),
+            # Unread counts: topics of a forum updated after a watermark
+            models.Index(fields=['forum', 'updated_at'], name='topic_forum_updated_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -102,7 +155,8 @@ class Topic(models.Model):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('forum:topic_detail', kwargs={
+        # Category and forum slugs come from the routing cache, not self.forum
+        return routing.topic_url(self.forum_id, self.slug, self.pk) or reverse('forum:topic_detail', kwargs={
             'category_slug': self.forum.category.slug,
             'forum_slug': self.forum.slug,
             'topic_slug': self.slug,
@@ -110,14 +164,26 @@ class Topic(models.Model):
         })
 
     def get_posts_count(self):
-        return self.posts.count()
+        return self.post_count
 
     def get_last_post(self):
-        return self.posts.select_related('author').order_by('-created_at').first()
+        return self.last_post
+
+    @staticmethod
+    def stats_expressions():
+        """Subqueries recomputing the denormalized counters, for use in update()."""
+        posts = Post.objects.filter(topic=OuterRef('pk'))
+        return {
+            'post_count': _count_subquery(posts, 'topic'),
+            'last_post': _last_post_subquery(posts, 'pk'),
+            'last_post_at': _last_post_subquery(posts, 'created_at'),
+        }
+
+    def update_stats(self):
+        Topic.objects.filter(pk=self.pk).update(**Topic.stats_expressions())
 
     def increment_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+        self.views += view_counter.incr(self.pk)
 
 
 class Post(models.Model):
@@ -125,18 +191,58 @@ class Post(models.Model):
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='posts')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = MarkdownxField()
+    content_html = models.TextField(blank=True, editable=False)
+    content_html_version = models.CharField(max_length=16, blank=True, editable=False)
     is_edited = models.BooleanField(default=False)
     edited_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Posts of a topic in reading order (topic_detail, last post lookups)
+            models.Index(fields=['topic', 'created_at'], name='post_topic_created_idx'),
+            # Latest posts on a member profile
+            models.Index(fields=['author', 'created_at'], name='post_author_created_idx'),
+        ]
+
+    def save(self, *args, render=True, **kwargs):
+        """
+        Save, rendering the content to HTML when it is saved. With
+        ``render=False`` the stored HTML is cleared instead and a background
+        job renders it (see forum.signals); until then get_content_html()
+        renders on demand.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            if render:
+                self.render_content()
+            else:
+                self.content_html = self.content_html_version = ''
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_html', 'content_html_version'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Post by {self.author.username} in {self.topic.title}"
 
     def get_absolute_url(self):
-        return f"{self.topic.get_absolute_url()}#post-{self.pk}"
+        # Redirects to the right page of the topic (forum.permalinks)
+        return reverse('forum:find_post', kwargs={'pk': self.pk})
+
+    def render_content(self):
+        self.content_html = render_markdown(self.content)
+        self.content_html_version = get_renderer_version()
+
+    def get_content_html(self):
+        """Stored HTML, re-rendered (and stored again) if the renderer changed."""
+        if self.content_html_version != get_renderer_version():
+            self.render_content()
+            Post.objects.filter(pk=self.pk).update(
+                content_html=self.content_html,
+                content_html_version=self.content_html_version,
+            )
+        return mark_safe(self.content_html)
 
     def is_first_post(self):
         return self.topic.posts.first() == self
@@ -146,21 +252,175 @@ class UserProfile(models.Model):
     """Extended user profile for forum members."""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # Hash of the processed avatar, empty until its thumbnails exist (forum.avatars)
+    avatar_version = models.CharField(max_length=12, blank=True, editable=False)
+    # Distinguishes uploads reusing a file name, for the processing job's key
+    avatar_uploaded_at = models.DateTimeField(null=True, blank=True, editable=False)
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(blank=True)
     signature = models.CharField(max_length=250, blank=True)
     post_count = models.IntegerField(default=0)
+    topic_count = models.IntegerField(default=0)
     joined_date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Profile of {self.user.username}"
 
-    def get_avatar_url(self):
-        if self.avatar:
-            return self.avatar.url
-        return '/static/images/default-avatar.png'
+    def get_avatar_url(self, size=96, format='jpeg'):
+        """URL of the square ``size`` px thumbnail (the nearest larger one generated)."""
+        if not (self.avatar and self.avatar_version):
+            return static('images/default-avatar.svg')
+        sizes = avatars.get_sizes()
+        size = next((s for s in sorted(sizes) if s >= size), max(sizes))
+        return avatars.thumbnail_url(self.user_id, self.avatar_version, size, format)
+
+    def get_avatar_srcset(self, format='webp'):
+        """``srcset`` value listing every thumbnail width, for use with ``sizes``."""
+        if not (self.avatar and self.avatar_version):
+            return ''
+        return ', '.join(
+            f'{avatars.thumbnail_url(self.user_id, self.avatar_version, size, format)} {size}w'
+            for size in avatars.get_sizes()
+        )
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """Atomically add ``deltas`` to a member's counters, e.g. ``bump(pk, post_count=1)``."""
+        cls.objects.filter(user_id=user_id).update(**{field: F(field) + n for field, n in deltas.items()})
+
+
+class ForumReadState(models.Model):
+    """
+    What a member has read in a forum (see forum.reading): every topic
+    updated up to ``marked_at``, plus a bounded set of later topics.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='forum_read_states')
+    forum = models.ForeignKey(Forum, on_delete=models.CASCADE, related_name='+')
+    marked_at = models.DateTimeField(help_text="Watermark: topics updated until then are read")
+    # {topic id: updated_at when read, in µs since the epoch}, only for topics newer than marked_at
+    topics = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'forum'], name='forum_read_state_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.forum_id}"
+
 
-    def update_post_count(self):
-        self.post_count = self.user.posts.count()
-        self.save(update_fields=['post_count'])
+class SiteStats(models.Model):
+    """Singleton row of site-wide totals, kept up to date by signals."""
+    total_topics = models.IntegerField(default=0)
+    total_posts = models.IntegerField(default=0)
+    total_users = models.IntegerField(default=0)
+    latest_member = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Site stats'
+
+    def __str__(self):
+        return "Site statistics"
+
+    @classmethod
+    def get(cls):
+        """The stats row, recounted from scratch if it is older than FORUM_STATS_RECONCILE_INTERVAL."""
+        stats, _ = cls.objects.select_related('latest_member').get_or_create(pk=1)
+        interval = timedelta(seconds=getattr(settings, 'FORUM_STATS_RECONCILE_INTERVAL', 3600))
+        if stats.reconciled_at is None or stats.reconciled_at < timezone.now() - interval:
+            stats.reconcile()
+        return stats
+
+    @classmethod
+    def bump(cls, **deltas):
+        """Atomically add ``deltas`` to the counters, e.g. ``bump(total_posts=1)``."""
+        cls.objects.filter(pk=1).update(**{field: F(field) + n for field, n in deltas.items()})
+
+    @classmethod
+    def latest_member_subquery(cls):
+        return Subquery(User.objects.order_by('-date_joined', '-pk').values('pk')[:1])
+
+    def reconcile(self):
+        self.total_topics = Topic.objects.count()
+        self.total_posts = Post.objects.count()
+        self.total_users = User.objects.count()
+        self.latest_member = User.objects.order_by('-date_joined', '-pk').first()
+        self.reconciled_at = timezone.now()
+        self.save()
+
+    def as_dict(self):
+        return {
+            'total_topics': self.total_topics,
+            'total_posts': self.total_posts,
+            'total_users': self.total_users,
+            'latest_member': self.latest_member.username if self.latest_member else None,
+        }
+
+
+class Job(models.Model):
+    """Background job, run by the run_jobs worker (see forum.jobs)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Terminé'),
+        (FAILED, 'Échoué'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # Unique among pending and running jobs only, so finished work can be queued again
+    key = models.CharField(max_length=200, null=True, blank=True, help_text="Idempotency key")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at', 'pk']
+        indexes = [
+            # Claiming due jobs
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=Q(status__in=['pending', 'running']), name='job_active_key_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a bulk import source, committed with each chunk (see forum.bulk)."""
+    source = models.CharField(max_length=500, unique=True)
+    position = models.BigIntegerField(default=0, help_text="Records processed")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.position}"
+
+
+class ImportIdMap(models.Model):
+    """Legacy id -> new primary key of an imported object, for resuming imports."""
+    source = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20)
+    legacy_id = models.CharField(max_length=64)
+    new_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'kind', 'legacy_id'], name='import_id_map_unique'),
+        ]
@@ -0,0 +1,140 @@
+"""
+Keyset (seek) pagination.
+
+Pages are addressed by an opaque cursor holding the sort key of the row
+next to the page boundary, so deep pages cost the same as the first one
+and no COUNT(*) is needed.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+LAST = 'last'
+
+# Listing orders of the forum views, ending with the pk to be unique
+TOPIC_ORDERING = ['-is_pinned', '-is_announced', '-updated_at', 'id']
+POST_ORDERING = ['created_at', 'id']
+
+
+class KeysetPage:
+    """A page of results, compatible with the iteration API of Django's Page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = LAST
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` on ``ordering``, a list of field names (``-`` for
+    descending) that must identify rows uniquely, e.g. ending with the pk.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+    def get_page(self, cursor=None):
+        """Return the page for ``cursor``; a missing or invalid cursor gives the first page."""
+        queryset, values, backwards, at_end = self._prepare(cursor)
+        return self._page(list(queryset), values, backwards, at_end)
+
+    async def aget_page(self, cursor=None):
+        """Async version of get_page()."""
+        queryset, values, backwards, at_end = self._prepare(cursor)
+        return self._page([obj async for obj in queryset], values, backwards, at_end)
+
+    def cursor_after(self, obj):
+        """Cursor of the page starting right after ``obj``."""
+        return self._encode('next', obj)
+
+    def queryset_after(self, values, reverse=False):
+        """The ordered queryset of rows after sort key ``values`` (all rows if None)."""
+        queryset = self.queryset.order_by(*self._order_by(reverse=reverse))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse=reverse))
+        return queryset
+
+    def _prepare(self, cursor):
+        """Return the query for ``cursor`` (one extra row to detect more pages) and how to read it."""
+        if cursor == LAST:
+            values, backwards, at_end = None, True, True
+        else:
+            try:
+                direction, values = self._decode(cursor)
+            except (TypeError, ValueError, ValidationError):
+                direction, values = 'next', None
+            backwards, at_end = direction == 'prev', False
+        return self.queryset_after(values, reverse=backwards)[:self.per_page + 1], values, backwards, at_end
+
+    def _page(self, rows, values, backwards, at_end):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        # Moving backwards, "more" means there is a previous page; the page we
+        # came from (if any) is always next. Moving forwards it is the mirror.
+        if backwards:
+            has_previous, has_next = more, values is not None and not at_end
+        else:
+            has_previous, has_next = values is not None, more
+        return KeysetPage(
+            rows,
+            next_cursor=self._encode('next', rows[-1]) if has_next else None,
+            previous_cursor=self._encode('prev', rows[0]) if has_previous else None,
+        )
+
+    def _order_by(self, reverse=False):
+        return [('-' if descending != reverse else '') + name for name, descending in self.ordering]
+
+    def _seek(self, values, reverse=False):
+        """Rows strictly after ``values`` in (possibly reversed) sort order."""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(self.ordering[:i]):
+                term &= Q(**{prev_name: values[j]})
+            condition |= term
+        return condition
+
+    def _encode(self, direction, obj):
+        values = [self._field(name).value_to_string(obj) for name, _ in self.ordering]
+        raw = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+        if direction not in ('next', 'prev') or len(values) != len(self.ordering):
+            raise ValueError("Malformed cursor")
+        return direction, [self._field(name).to_python(value) for (name, _), value in zip(self.ordering, values)]
+
+    def _field(self, name):
+        return self.queryset.model._meta.get_field(name)
@@ -0,0 +1,49 @@
+"""
+Post permalinks: the URL of a topic page starting with a post.
+
+The page is addressed by a keyset cursor taken from the post just before
+it in the topic's reading order, so no COUNT or OFFSET is needed and the
+cursor stays valid when that post is deleted. The result is cached per
+post under the topic's fragment version, which any new, edited or
+deleted post of the topic bumps.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import fragments, routing
+from .models import Post, Topic
+from .pagination import KeysetPaginator, POST_ORDERING
+
+
+def _key(pk):
+    return f'post-cursor:{pk}'
+
+
+def _locate(pk):
+    """``(version, topic_id, forum_id, topic_slug, cursor)`` of a post, or None if it does not exist."""
+    post = Post.objects.filter(pk=pk).values('topic_id', 'topic__forum_id', 'topic__slug', 'created_at').first()
+    if post is None:
+        return None
+    # Read before looking up, so a concurrent change leaves the entry stale, not wrong
+    version = fragments.get_version(Topic(pk=post['topic_id']))
+    paginator = KeysetPaginator(Post.objects.filter(topic_id=post['topic_id']), 1, POST_ORDERING)
+    previous = paginator.queryset_after([post['created_at'], pk], reverse=True).only('created_at').first()
+    cursor = paginator.cursor_after(previous) if previous else None
+    return version, post['topic_id'], post['topic__forum_id'], post['topic__slug'], cursor
+
+
+def post_url(pk):
+    """URL of the page and anchor of post ``pk``, or None if it does not exist."""
+    entry = cache.get(_key(pk))
+    if entry is None or entry[0] != fragments.get_version(Topic(pk=entry[1])):
+        entry = _locate(pk)
+        if entry is None:
+            return None
+        cache.set(_key(pk), entry, settings.FORUM_PAGE_CACHE_TIMEOUT)
+    _, topic_id, forum_id, topic_slug, cursor = entry
+    url = routing.topic_url(forum_id, topic_slug, topic_id)
+    if url is None:
+        # Forum unknown to the routing cache yet
+        url = Topic.objects.select_related('forum__category').get(pk=topic_id).get_absolute_url()
+    query = f'?cursor={cursor}' if cursor else ''
+    return f'{url}{query}#post-{pk}'
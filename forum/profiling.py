@@ -0,0 +1,34 @@
+"""
+Per-request timing collector used by ProfilingMiddleware.
+
+Code that wants its time reported wraps itself in ``timed('name')``; the
+timings end up in the ``Server-Timing`` header and the slow-request log.
+Outside a profiled request ``timed`` only costs a context variable lookup.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current = ContextVar('forum_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.timings = {}
+        self.queries = []
+
+    def add(self, name, duration):
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+
+
+@contextmanager
+def timed(name):
+    profile = current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
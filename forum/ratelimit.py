@@ -0,0 +1,172 @@
+"""
+Rate limiting of expensive and write views, per URL name.
+
+``FORUM_RATE_LIMITS`` maps a URL name to rules ``(key, rate, methods)``:
+``key`` is ``'ip'``, ``'user'`` (authenticated users only) or
+``'post:<field>'`` (a submitted field, e.g. the username tried at login);
+``rate`` is ``'<count>/<period>'`` with a period such as ``s``, ``m``,
+``10m``, ``h`` or ``d``. A request over any of its rules gets a 429 with a
+``Retry-After`` header.
+
+Each rule behaves like a token bucket of ``count`` tokens refilled over
+the period, approximated with a sliding-window counter: the hits of the
+current fixed window plus the previous window's, weighted by how much of
+it still overlaps the sliding window. That is two integers per key, and
+only needs an atomic increment from the backend, where a real bucket
+needs an atomic read-modify-write.
+
+The local backend counts per process; ``CacheBackend`` shares counters
+between workers through a Django cache whose ``incr`` is atomic
+(Memcached, Redis).
+"""
+import hashlib
+import ipaddress
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+
+
+def parse_rate(rate):
+    """``'10/5m'`` -> ``(10, 300)``."""
+    match = RATE_RE.match(rate.replace(' ', ''))
+    if match is None:
+        raise ValueError(f"Invalid rate {rate!r}, expected e.g. '10/m' or '100/10m'")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def client_ip(request):
+    header = getattr(settings, 'FORUM_RATE_LIMIT_IP_HEADER', None)
+    value = request.META.get('REMOTE_ADDR', '')
+    if header:
+        # The last address is the one added by our own proxy
+        forwarded = [part.strip() for part in request.headers.get(header, '').split(',') if part.strip()]
+        value = forwarded[-1] if forwarded else value
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return value
+    # An IPv6 client usually controls a whole /64
+    if address.version == 6:
+        return str(ipaddress.ip_network(f'{address}/64', strict=False))
+    return str(address)
+
+
+@dataclass(frozen=True)
+class Rule:
+    key: str
+    limit: int
+    period: int
+    methods: tuple
+
+    @classmethod
+    def from_setting(cls, key, rate, methods=('POST',)):
+        if isinstance(methods, str):
+            methods = (methods,)
+        limit, period = parse_rate(rate)
+        return cls(key, limit, period, tuple(method.upper() for method in methods))
+
+    def identify(self, request):
+        """The value counted for this request, or ``None`` if the rule does not apply."""
+        if request.method not in self.methods:
+            return None
+        if self.key == 'ip':
+            return client_ip(request)
+        if self.key == 'user':
+            return str(request.user.pk) if request.user.is_authenticated else None
+        if self.key.startswith('post:'):
+            return request.POST.get(self.key[5:], '').strip().lower() or None
+        raise ValueError(f"Unknown rate limit key {self.key!r}")
+
+
+class LocalBackend:
+    """Counters in this process, at most ``max_keys`` of them (least recently used dropped)."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self.windows = OrderedDict()  # key -> [window, current, previous]
+        self.lock = threading.Lock()
+
+    def hit(self, key, period, now):
+        """Count a hit; return the ``(current, previous)`` window counts."""
+        window = int(now // period)
+        with self.lock:
+            entry = self.windows.get(key)
+            if entry is None or entry[0] < window - 1:
+                entry = [window, 0, 0]
+            elif entry[0] == window - 1:
+                entry = [window, 0, entry[1]]
+            entry[1] += 1
+            self.windows[key] = entry
+            self.windows.move_to_end(key)
+            if len(self.windows) > self.max_keys:
+                self.windows.popitem(last=False)
+            return entry[1], entry[2]
+
+
+class CacheBackend:
+    """Counters in a Django cache (``FORUM_RATE_LIMIT_CACHE``), shared by every worker."""
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or getattr(settings, 'FORUM_RATE_LIMIT_CACHE', 'default')]
+
+    def hit(self, key, period, now):
+        window = int(now // period)
+        current_key, previous_key = f'ratelimit:{key}:{window}', f'ratelimit:{key}:{window - 1}'
+        # Kept long enough to serve as the next window's previous count
+        self.cache.add(current_key, 0, timeout=2 * period)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, 1, timeout=2 * period)
+            current = 1
+        return current, self.cache.get(previous_key, 0)
+
+
+def retry_after(limit, period, now, current, previous):
+    """Seconds until one more hit would be allowed."""
+    elapsed = (now % period) / period
+    if current + 1 <= limit and previous:
+        # Within this window, once enough of the previous one slides out
+        wait = (1 - (limit - current - 1) / previous) - elapsed
+    else:
+        # In the next window, where this window's hits are the previous count
+        wait = (1 - elapsed) + max(0.0, 1 - (limit - 1) / current)
+    return max(1, math.ceil(wait * period))
+
+
+class RateLimiter:
+    def __init__(self, limits, backend):
+        self.rules = {
+            name: [Rule.from_setting(*rule) for rule in rules]
+            for name, rules in limits.items()
+        }
+        self.backend = backend
+
+    def check(self, request, view_name):
+        """Count the request against its rules; return seconds to wait if over a limit, else ``None``."""
+        wait = None
+        now = time.time()
+        for index, rule in enumerate(self.rules.get(view_name, ())):
+            value = rule.identify(request)
+            if value is None:
+                continue
+            # Fixed-size keys, whatever was submitted
+            digest = hashlib.md5(value.encode()).hexdigest()
+            current, previous = self.backend.hit(f'{view_name}:{index}:{digest}', rule.period, now)
+            weight = 1 - (now % rule.period) / rule.period
+            if previous * weight + current > rule.limit:
+                seconds = retry_after(rule.limit, rule.period, now, current, previous)
+                wait = max(wait or 0, seconds)
+        return wait
+
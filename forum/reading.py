@@ -0,0 +1,151 @@
+"""
+Unread topic tracking, built on ``Topic.updated_at``.
+
+A member's reads in a forum are a ``ForumReadState``: a "mark all read"
+watermark, plus the ``updated_at`` each topic newer than it had when it
+was last read. The markers are bounded (``FORUM_READ_MARKERS``): beyond
+that, the oldest are folded into the watermark, which may mark a few old
+topics as read that never were. Without a state, the watermark is the
+date the member joined.
+
+A topic is unread when ``updated_at`` is later than both. Unread counts
+per forum are cached per member, keyed by the forum's fragment version so
+any new post or topic invalidates them.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import fragments, routing
+from .models import Forum, ForumReadState, Topic
+from .routers import primary
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _us(value):
+    # Exact, so a marker folded into the watermark compares equal to updated_at
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_us(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def _counts_key(user_id, forum_id):
+    return f'unread:{user_id}:{forum_id}'
+
+
+def _is_unread(topic, watermark, markers):
+    if topic.updated_at <= watermark:
+        return False
+    marker = markers.get(str(topic.pk))
+    return marker is None or _us(topic.updated_at) > marker
+
+
+def _collapse(state):
+    """Drop markers the watermark covers, then fold the oldest beyond the limit into it."""
+    watermark = _us(state.marked_at)
+    markers = {pk: read for pk, read in state.topics.items() if read > watermark}
+    excess = len(markers) - getattr(settings, 'FORUM_READ_MARKERS', 100)
+    if excess > 0:
+        oldest = sorted(markers.items(), key=lambda item: item[1])[:excess]
+        state.marked_at = max(state.marked_at, _from_us(oldest[-1][1]))
+        markers = {pk: read for pk, read in markers.items() if read > oldest[-1][1]}
+    state.topics = markers
+
+
+def annotate_unread(user, forum_id, topics):
+    """Set ``is_unread`` on a page of topics of one forum, with a single query."""
+    if not user.is_authenticated:
+        for topic in topics:
+            topic.is_unread = False
+        return
+    state = ForumReadState.objects.filter(user=user, forum_id=forum_id).first()
+    watermark, markers = (state.marked_at, state.topics) if state else (user.date_joined, {})
+    for topic in topics:
+        topic.is_unread = _is_unread(topic, watermark, markers)
+
+
+def mark_topic_read(user, topic):
+    """Record that ``user`` has seen ``topic`` as of its current ``updated_at``."""
+    if not user.is_authenticated:
+        return
+    # Read-modify-write: a lagging replica would lose markers
+    with primary():
+        state, created = ForumReadState.objects.get_or_create(
+            user=user, forum_id=topic.forum_id, defaults={'marked_at': user.date_joined},
+        )
+        if not _is_unread(topic, state.marked_at, state.topics):
+            return
+        state.topics[str(topic.pk)] = _us(topic.updated_at)
+        _collapse(state)
+        state.save(update_fields=['marked_at', 'topics'])
+    cache.delete(_counts_key(user.pk, topic.forum_id))
+
+
+def mark_forum_read(user, forum_ids):
+    """Move the watermark of each forum to now and forget its markers."""
+    now = timezone.now()
+    with primary():
+        existing = set(
+            ForumReadState.objects.filter(user=user, forum_id__in=forum_ids).values_list('forum_id', flat=True)
+        )
+        ForumReadState.objects.filter(user=user, forum_id__in=existing).update(marked_at=now, topics={})
+        ForumReadState.objects.bulk_create([
+            ForumReadState(user=user, forum_id=forum_id, marked_at=now)
+            for forum_id in forum_ids if forum_id not in existing
+        ], ignore_conflicts=True)
+    cache.delete_many([_counts_key(user.pk, forum_id) for forum_id in forum_ids])
+
+
+def _count_unread(user, forum_ids):
+    """``{forum_id: unread topics}``: one aggregate, plus one query for the markers."""
+    states = {state.forum_id: state for state in ForumReadState.objects.filter(user=user, forum_id__in=forum_ids)}
+    watermarks = {
+        forum_id: states[forum_id].marked_at if forum_id in states else user.date_joined
+        for forum_id in forum_ids
+    }
+    unread = Q()
+    for forum_id, watermark in watermarks.items():
+        unread |= Q(forum_id=forum_id, updated_at__gt=watermark)
+    counts = dict.fromkeys(forum_ids, 0)
+    counts.update(Topic.objects.filter(unread).order_by().values_list('forum_id').annotate(Count('pk')))
+
+    # Counted above but read since
+    marked = [int(pk) for state in states.values() for pk in state.topics]
+    for topic in Topic.objects.filter(pk__in=marked).only('pk', 'forum_id', 'updated_at'):
+        state = states.get(topic.forum_id)
+        if state and topic.updated_at > state.marked_at and not _is_unread(topic, state.marked_at, state.topics):
+            counts[topic.forum_id] -= 1
+    return counts
+
+
+def unread_counts(user, forum_ids=None):
+    """``{forum_id: unread topics}`` for ``user``, from the cache where still current."""
+    if not user.is_authenticated:
+        return {}
+    if forum_ids is None:
+        forum_ids = list(routing.get_snapshot().slugs)
+    versions = fragments.get_versions([Forum(pk=forum_id) for forum_id in forum_ids])
+    cached = cache.get_many([_counts_key(user.pk, forum_id) for forum_id in forum_ids])
+
+    counts, stale = {}, []
+    for forum_id in forum_ids:
+        entry = cached.get(_counts_key(user.pk, forum_id))
+        if entry is not None and entry[0] == versions[forum_id]:
+            counts[forum_id] = entry[1]
+        else:
+            stale.append(forum_id)
+    if stale:
+        fresh = _count_unread(user, stale)
+        cache.set_many(
+            {_counts_key(user.pk, forum_id): (versions[forum_id], count) for forum_id, count in fresh.items()},
+            getattr(settings, 'FORUM_UNREAD_CACHE_TIMEOUT', 3600),
+        )
+        counts.update(fresh)
+    return counts
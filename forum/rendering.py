@@ -0,0 +1,50 @@
+"""
+Markdown rendering and sanitizing of post contents.
+
+Rendered HTML is stored on the post together with ``RENDERER_VERSION``, a
+stamp derived from the library versions and the configured extensions and
+allowlists, so changing any of them marks stored HTML as stale.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+import bleach
+import markdown
+from django.conf import settings
+from .profiling import timed
+
+DEFAULT_ALLOWED_TAGS = [
+    'p', 'br', 'hr', 'strong', 'em', 'del', 'blockquote', 'code', 'pre',
+    'ul', 'ol', 'li', 'a', 'img', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+]
+DEFAULT_ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title'],
+    'img': ['src', 'alt', 'title'],
+}
+
+
+def get_renderer_config():
+    """Everything that affects the rendered HTML, as plain picklable data."""
+    return {
+        'extensions': list(getattr(settings, 'MARKDOWNX_MARKDOWN_EXTENSIONS', [])),
+        'tags': list(getattr(settings, 'FORUM_ALLOWED_TAGS', DEFAULT_ALLOWED_TAGS)),
+        'attributes': dict(getattr(settings, 'FORUM_ALLOWED_ATTRIBUTES', DEFAULT_ALLOWED_ATTRIBUTES)),
+        'markdown': markdown.__version__,
+        'bleach': bleach.__version__,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_renderer_version():
+    config = json.dumps(get_renderer_config(), sort_keys=True)
+    return hashlib.sha1(config.encode()).hexdigest()[:16]
+
+
+def render_markdown(text, config=None):
+    """Render Markdown to sanitized HTML. ``config`` lets pool workers skip settings."""
+    config = config or get_renderer_config()
+    with timed('markdown'):
+        html = markdown.markdown(text, extensions=config['extensions'])
+        return bleach.clean(html, tags=config['tags'], attributes=config['attributes'], strip=True)
@@ -0,0 +1,72 @@
+"""
+Read-replica database routing.
+
+Reads of the apps in ``FORUM_REPLICA_APPS`` go to the aliases listed in
+``FORUM_REPLICAS`` (alias -> weight), picked at random by weight or in
+weighted round-robin order (``FORUM_REPLICA_SELECTION``). Writes always go
+to ``default``, and so do reads made inside ``primary()``: the
+ReplicaPinMiddleware uses it for write requests and for a few seconds
+after them, so users see their own writes despite replication lag.
+"""
+import itertools
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_pinned = ContextVar('forum_use_primary', default=False)
+
+
+@contextmanager
+def primary():
+    """Send every read made in this block to the primary database."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = dict(getattr(settings, 'FORUM_REPLICAS', {}))
+        self.apps = set(getattr(settings, 'FORUM_REPLICA_APPS', ('forum', 'accounts')))
+        self.selection = getattr(settings, 'FORUM_REPLICA_SELECTION', 'weighted')
+        # Each alias appears weight times in the round-robin cycle
+        self._cycle = itertools.cycle([
+            alias for alias, weight in self.replicas.items() for _ in range(weight)
+        ])
+        self._lock = threading.Lock()
+
+    def _pick(self):
+        if self.selection == 'round_robin':
+            with self._lock:
+                return next(self._cycle)
+        return random.choices(list(self.replicas), weights=list(self.replicas.values()))[0]
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or model._meta.app_label not in self.apps or _pinned.get():
+            return None
+        return self._pick()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {'default', *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in self.replicas:
+            return False
+        return None
@@ -0,0 +1,133 @@
+"""
+In-process routing cache for the category/forum tree.
+
+Maps (category slug, forum slug) to forum id and forum id to its slugs, so
+forum lookups and URL building need no query. The tree is small and
+rarely changes: each process keeps a snapshot and compares its version
+with the shared one in the cache at most every
+FORUM_ROUTING_CHECK_INTERVAL seconds. Category and Forum signal handlers
+bump the shared version on commit.
+
+The cache may not be shared (LocMemCache is per process), so correctness
+does not rest on it: an unknown slug or id is looked up in the database
+and rebuilds the snapshot if it exists, and a snapshot older than
+FORUM_ROUTING_MAX_AGE seconds is rebuilt anyway, which bounds how long a
+renamed forum's old slugs keep resolving.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+VERSION_KEY = 'forum:routing:version'
+
+
+class Snapshot:
+    def __init__(self, version, forums):
+        self.version = version
+        self.built_at = self.checked_at = time.monotonic()
+        # forum id -> (category slug, forum slug), and back
+        self.slugs = forums
+        self.ids = {slugs: pk for pk, slugs in forums.items()}
+        self.urls = {}
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _shared_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Time based, like fragment versions, so an evicted version never repeats
+        version = int(time.time() * 1000)
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _build(version):
+    from .models import Forum
+    forums = Forum.objects.values_list('pk', 'category__slug', 'slug')
+    return Snapshot(version, {pk: (category_slug, slug) for pk, category_slug, slug in forums})
+
+
+def get_snapshot(check=False, rebuild=False):
+    """
+    Current snapshot; ``check`` compares versions regardless of the
+    interval, ``rebuild`` reloads the tree whatever the version.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None and now - snapshot.built_at >= getattr(settings, 'FORUM_ROUTING_MAX_AGE', 60):
+        rebuild = True
+    interval = getattr(settings, 'FORUM_ROUTING_CHECK_INTERVAL', 1.0)
+    if snapshot is not None and not (check or rebuild) and now - snapshot.checked_at < interval:
+        return snapshot
+    version = _shared_version()
+    if snapshot is not None and snapshot.version == version and not rebuild:
+        snapshot.checked_at = now
+        return snapshot
+    with _lock:
+        if rebuild or _snapshot is None or _snapshot.version != version:
+            _snapshot = _build(version)
+        return _snapshot
+
+
+def invalidate():
+    """Drop every process's snapshot; call after the change is committed."""
+    global _snapshot
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+    _snapshot = None
+
+
+def forum_id(category_slug, forum_slug):
+    """Id of the forum at these slugs, or None."""
+    pk = get_snapshot().ids.get((category_slug, forum_slug))
+    if pk is None:
+        from .models import Forum
+        # Maybe created or renamed since, in a process not sharing our cache
+        if Forum.objects.filter(category__slug=category_slug, slug=forum_slug).exists():
+            pk = get_snapshot(rebuild=True).ids.get((category_slug, forum_slug))
+    return pk
+
+
+def forum_slugs(pk):
+    """``(category_slug, forum_slug)`` of a forum, or None."""
+    slugs = get_snapshot().slugs.get(pk)
+    if slugs is None:
+        from .models import Forum
+        if Forum.objects.filter(pk=pk).exists():
+            slugs = get_snapshot(rebuild=True).slugs.get(pk)
+    return slugs
+
+
+def forum_url(pk):
+    """URL of a forum, or None if it is not in the tree (e.g. not committed yet)."""
+    snapshot = get_snapshot()
+    url = snapshot.urls.get(pk)
+    if url is None:
+        slugs = forum_slugs(pk)
+        if slugs is None:
+            return None
+        url = snapshot.urls[pk] = reverse('forum:forum_detail', kwargs={
+            'category_slug': slugs[0], 'forum_slug': slugs[1],
+        })
+    return url
+
+
+def topic_url(forum_pk, topic_slug, topic_pk):
+    """URL of a topic, or None if its forum is not in the tree."""
+    slugs = forum_slugs(forum_pk)
+    if slugs is None:
+        return None
+    category_slug, forum_slug = slugs
+    return reverse('forum:topic_detail', kwargs={
+        'category_slug': category_slug, 'forum_slug': forum_slug, 'topic_slug': topic_slug, 'pk': topic_pk,
+    })
@@ -0,0 +1,212 @@
+"""
+Full-text search over topic titles and post contents.
+
+The default backend stores one row per topic title and one per post in a
+SQLite FTS5 table and ranks matches with BM25. Another backend can be
+selected with the ``FORUM_SEARCH_BACKEND`` setting.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Topic, Post
+
+FTS_TABLE = 'forum_search'
+
+# Private-use markers survive escaping and are swapped for <mark> afterwards
+_MARK_START, _MARK_END = '\ue000', '\ue001'
+
+
+class SearchResults:
+    """Lazy, sliceable list of topics matching a query, usable with Paginator."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            stop = index.stop if index.stop is not None else self.count()
+            return self.backend.fetch(self.query, start, max(stop - start, 0))
+        return self.backend.fetch(self.query, index, 1)[0]
+
+
+class BaseSearchBackend:
+    """Interface for search backends."""
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def fetch(self, query, offset, limit):
+        raise NotImplementedError
+
+    def index_topic(self, topic):
+        pass
+
+    def index_post(self, post):
+        pass
+
+    def remove_topic(self, topic_id, post_ids=()):
+        """Remove a topic, and ``post_ids`` of its posts deleted along with it."""
+
+    def remove_post(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Unindexed LIKE search, for databases without a full-text engine."""
+
+    def _queryset(self, query):
+        matching_posts = Post.objects.filter(content__icontains=query).values('topic')
+        return Topic.objects.filter(Q(title__icontains=query) | Q(pk__in=matching_posts))
+
+    def count(self, query):
+        return self._queryset(query).count()
+
+    def fetch(self, query, offset, limit):
+        topics = list(self._queryset(query).select_related('forum__category', 'author')[offset:offset + limit])
+        for topic in topics:
+            topic.search_snippet = ''
+        return topics
+
+
+class FTS5SearchBackend(BaseSearchBackend):
+    """SQLite FTS5 index ranked with BM25 (titles weigh more than posts)."""
+
+    # Topic title rows use the negated topic id as rowid, post rows the post id
+    title_weight = 10.0
+    content_weight = 1.0
+    snippet_tokens = 16
+
+    @staticmethod
+    def to_match_expression(query):
+        """Turn free text into an FTS5 expression: every term, last one as prefix."""
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return None
+        quoted = ['"%s"' % term for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def count(self, query):
+        match = self.to_match_expression(query)
+        if match is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT topic_id) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [match],
+            )
+            return cursor.fetchone()[0]
+
+    def fetch(self, query, offset, limit):
+        match = self.to_match_expression(query)
+        if match is None or limit <= 0:
+            return []
+        # SQLite returns the bare ``snip`` column from the row holding MIN(rank).
+        # LIMIT -1 keeps the subquery from being flattened into the aggregate,
+        # where the FTS5 auxiliary functions are not allowed.
+        sql = f'''
+            SELECT topic_id, MIN(rank), snip FROM (
+                SELECT topic_id,
+                       bm25({FTS_TABLE}, %s, %s) AS rank,
+                       snippet({FTS_TABLE}, -1, %s, %s, '…', %s) AS snip
+                FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+                LIMIT -1
+            )
+            GROUP BY topic_id ORDER BY MIN(rank), topic_id LIMIT %s OFFSET %s
+        '''
+        params = [
+            self.title_weight, self.content_weight,
+            _MARK_START, _MARK_END, self.snippet_tokens,
+            match, limit, offset,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        topics = Topic.objects.select_related('forum__category', 'author').in_bulk([row[0] for row in rows])
+        results = []
+        for topic_id, rank, snippet in rows:
+            topic = topics.get(topic_id)
+            if topic is None:
+                continue
+            topic.search_rank = rank
+            topic.search_snippet = self.highlight(snippet)
+            results.append(topic)
+        return results
+
+    @staticmethod
+    def highlight(snippet):
+        return mark_safe(escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def index_topic(self, topic):
+        self.remove_topic(topic.pk)
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content, topic_id) VALUES (%s, %s, '', %s)",
+            [-topic.pk, topic.title, topic.pk],
+        )
+
+    def index_post(self, post):
+        self.remove_post(post.pk)
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content, topic_id) VALUES (%s, '', %s, %s)",
+            [post.pk, post.content, post.topic_id],
+        )
+
+    def remove_topic(self, topic_id, post_ids=()):
+        # By rowid: topic_id is UNINDEXED, filtering on it scans the whole index
+        rowids = [-topic_id, *post_ids]
+        for start in range(0, len(rowids), 500):
+            batch = rowids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(batch))
+            self._execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+
+    def remove_post(self, post_id):
+        self._execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        self._execute(f'DELETE FROM {FTS_TABLE}')
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content, topic_id) "
+            f"SELECT -id, title, '', id FROM {Topic._meta.db_table}"
+        )
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content, topic_id) "
+            f"SELECT id, '', content, topic_id FROM {Post._meta.db_table}"
+        )
+        self._execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    backend = getattr(settings, 'FORUM_SEARCH_BACKEND', None)
+    if backend is None:
+        backend = 'forum.search.FTS5SearchBackend' if connection.vendor == 'sqlite' else 'forum.search.LikeSearchBackend'
+    return import_string(backend)()
@@ -0,0 +1,249 @@
+"""
+Signal handlers keeping the denormalized forum statistics, the member and
+site-wide totals, the search index and the fragment cache versions in sync,
+and pushing new posts to live topic readers. Search indexing, Markdown
+rendering and avatar processing are queued as background jobs (forum.tasks).
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from . import fragments, jobs, live, metrics, routing, tasks
+from .models import Category, Forum, Topic, Post, SiteStats, UserProfile
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Topic)
+def topic_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Forum.objects.filter(pk=instance.forum_id).update(topic_count=F('topic_count') + 1)
+
+
+@receiver(post_delete, sender=Topic)
+def topic_deleted(sender, instance, origin=None, **kwargs):
+    # The whole forum is going away, nothing left to update
+    if isinstance(origin, (Forum, Category)):
+        return
+    Forum.objects.filter(pk=instance.forum_id).update(**Forum.stats_expressions())
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    last_post = {'last_post': instance, 'last_post_at': instance.created_at}
+    Topic.objects.filter(pk=instance.topic_id).update(post_count=F('post_count') + 1, **last_post)
+    Forum.objects.filter(topics=instance.topic_id).update(post_count=F('post_count') + 1, **last_post)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a topic recounts its forum once instead of once per post
+    if isinstance(origin, (Topic, Forum, Category)):
+        return
+    stats = Topic.stats_expressions()
+    del stats['post_count']
+    Topic.objects.filter(pk=instance.topic_id).update(post_count=F('post_count') - 1, **stats)
+    stats = Forum.stats_expressions()
+    del stats['post_count'], stats['topic_count']
+    Forum.objects.filter(topics=instance.topic_id).update(post_count=F('post_count') - 1, **stats)
+
+
+@receiver(post_save, sender=Topic)
+def index_topic(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'title' not in update_fields):
+        return
+    jobs.enqueue_on_commit(
+        tasks.index_topic, instance.pk, key=tasks.content_key('index_topic', instance.pk, instance.title)
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'content' not in update_fields):
+        return
+    jobs.enqueue_on_commit(
+        tasks.index_post, instance.pk, key=tasks.content_key('index_post', instance.pk, instance.content)
+    )
+
+
+@receiver(post_save, sender=UserProfile)
+def process_avatar(sender, instance, raw=False, **kwargs):
+    # New upload, see ProfileForm.save()
+    if raw or not instance.avatar or instance.avatar_version:
+        return
+    # The same file name comes back once the first job has moved it aside
+    uploaded = instance.avatar_uploaded_at.timestamp() if instance.avatar_uploaded_at else ''
+    jobs.enqueue_on_commit(
+        tasks.process_avatar, instance.pk, instance.avatar.name,
+        key=f'avatar:{instance.pk}:{instance.avatar.name}:{uploaded}',
+    )
+
+
+@receiver(post_save, sender=Post)
+def render_post(sender, instance, raw=False, **kwargs):
+    # Saved with render=False
+    if raw or instance.content_html_version:
+        return
+    jobs.enqueue_on_commit(
+        tasks.render_post, instance.pk, key=tasks.content_key('render_post', instance.pk, instance.content)
+    )
+
+
+@receiver(post_delete, sender=Topic)
+def unindex_topic(sender, instance, **kwargs):
+    get_search_backend().remove_topic(instance.pk, getattr(instance, 'deleted_post_ids', ()))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, origin=None, **kwargs):
+    # Removed with the whole topic by unindex_topic
+    if isinstance(origin, (Topic, Forum, Category)):
+        return
+    get_search_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Topic)
+def count_topic(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SiteStats.bump(total_topics=1)
+        metrics.topics_created.inc()
+
+
+@receiver(pre_delete, sender=Topic)
+def collect_deleted_posts(sender, instance, origin=None, **kwargs):
+    # Posts deleted along with a topic are unindexed and uncounted once per
+    # topic, see unindex_topic, uncount_topic and uncount_member_topic_posts;
+    # deleting a member still goes through the per-post handlers
+    if isinstance(origin, (Topic, Forum, Category)):
+        posts = list(Post.objects.filter(topic=instance).values_list('pk', 'author_id'))
+        instance.deleted_post_ids = [pk for pk, _ in posts]
+        instance.deleted_posts_by_author = Counter(author_id for _, author_id in posts)
+
+
+@receiver(post_delete, sender=Topic)
+def uncount_topic(sender, instance, **kwargs):
+    posts = sum(getattr(instance, 'deleted_posts_by_author', {}).values())
+    SiteStats.bump(total_topics=-1, total_posts=-posts)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SiteStats.bump(total_posts=1)
+        metrics.posts_created.inc()
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, (Topic, Forum, Category)):
+        return
+    SiteStats.bump(total_posts=-1)
+
+
+@receiver(post_save, sender=Topic)
+def count_member_topic(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserProfile.bump(instance.author_id, topic_count=1)
+
+
+@receiver(post_delete, sender=Topic)
+def uncount_member_topic(sender, instance, origin=None, **kwargs):
+    # The author's profile is being deleted along with them
+    if isinstance(origin, User) and origin.pk == instance.author_id:
+        return
+    UserProfile.bump(instance.author_id, topic_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def count_member_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserProfile.bump(instance.author_id, post_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_member_post(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User) and origin.pk == instance.author_id:
+        return
+    if isinstance(origin, (Topic, Forum, Category)):
+        return
+    UserProfile.bump(instance.author_id, post_count=-1)
+
+
+@receiver(post_delete, sender=Topic)
+def uncount_member_topic_posts(sender, instance, **kwargs):
+    for author_id, posts in getattr(instance, 'deleted_posts_by_author', {}).items():
+        UserProfile.bump(author_id, post_count=-posts)
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SiteStats.objects.filter(pk=1).update(total_users=F('total_users') + 1, latest_member=instance)
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    SiteStats.objects.filter(pk=1).update(
+        total_users=F('total_users') - 1,
+        latest_member=SiteStats.latest_member_subquery(),
+    )
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_fragments(sender, instance, **kwargs):
+    fragments.bump_version(instance)
+    fragments.bump_version()
+    fragments.bump_version(fragments.STRUCTURE)
+
+
+@receiver([post_save, post_delete], sender=Forum)
+def invalidate_forum_fragments(sender, instance, **kwargs):
+    fragments.bump_forum(instance.pk, instance.category_id)
+    fragments.bump_version(fragments.STRUCTURE)
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Forum)
+def invalidate_routing(sender, **kwargs):
+    # Once committed, or another process could cache the old tree under the new version
+    transaction.on_commit(routing.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def invalidate_topic_fragments(sender, instance, origin=None, **kwargs):
+    fragments.bump_version(instance)
+    if isinstance(origin, (Forum, Category)):
+        return
+    fragments.bump_forum(instance.forum_id)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_fragments(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, (Topic, Forum, Category)):
+        return
+    fragments.bump_version(Topic(pk=instance.topic_id))
+    fragments.bump_forum(instance.topic.forum_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_member_stats(sender, instance, **kwargs):
+    fragments.bump_version(SiteStats(pk=1))
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_member_fragments(sender, instance, created=False, update_fields=None, **kwargs):
+    # A new member is shown nowhere yet, and logging in only saves last_login
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    fragments.bump_version(fragments.MEMBERS)
+
+
+@receiver(post_save, sender=Post)
+def publish_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: live.publish_post(instance))
@@ -0,0 +1,54 @@
+"""
+Static files storage: content-hashed names plus pre-compressed copies.
+
+``collectstatic`` writes every file under a name carrying a hash of its
+content (``style.3f2a9c1b7e4d.css``) and, for text formats, ``.gz`` and
+``.br`` siblings compressed once at maximum level. StaticFilesMiddleware
+serves them with the encoding the browser accepts. Brotli output needs the
+optional ``Brotli`` package.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico'}
+# Not worth a compressed copy below this many bytes, or when saving less than 5%
+MIN_SIZE = 256
+MIN_RATIO = 0.95
+
+
+def compress(data):
+    """``{extension: compressed bytes}`` for the encodings worth serving."""
+    encoded = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['.br'] = brotli.compress(data, quality=11)
+    return {ext: body for ext, body in encoded.items() if len(body) < len(data) * MIN_RATIO}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            for compressed in self._compress(name):
+                yield name, compressed, True
+
+    def _compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < MIN_SIZE:
+            return
+        for ext, body in compress(data).items():
+            with open(path + ext, 'wb') as file:
+                file.write(body)
+            yield name + ext
@@ -0,0 +1,63 @@
+"""
+Background jobs of the forum write paths, queued by forum.signals.
+"""
+import hashlib
+
+from django.core.files.storage import default_storage
+
+from . import avatars, fragments
+from .jobs import job
+from .models import Topic, Post, UserProfile
+from .rendering import get_renderer_version
+from .search import get_search_backend
+
+
+def content_key(name, pk, text):
+    """Idempotency key: one job per object and content."""
+    return f'{name}:{pk}:{hashlib.md5(text.encode()).hexdigest()}'
+
+
+@job
+def index_topic(topic_id):
+    topic = Topic.objects.filter(pk=topic_id).first()
+    if topic is not None:
+        get_search_backend().index_topic(topic)
+
+
+@job
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        get_search_backend().index_post(post)
+
+
+@job
+def render_post(post_id):
+    post = Post.objects.filter(pk=post_id).only('content', 'content_html_version').first()
+    if post is not None and post.content_html_version != get_renderer_version():
+        post.render_content()
+        # Unless edited again meanwhile
+        Post.objects.filter(pk=post_id, content=post.content).update(
+            content_html=post.content_html,
+            content_html_version=post.content_html_version,
+        )
+
+
+@job
+def process_avatar(profile_id, name, force=False):
+    profile = UserProfile.objects.filter(pk=profile_id).only('user_id', 'avatar', 'avatar_version').first()
+    # Gone, or replaced by a newer upload with its own job
+    if profile is None or profile.avatar.name != name:
+        return
+    if profile.avatar_version and not force:
+        return
+    clean_name, version = avatars.process(profile.user_id, name, force=force)
+    updated = UserProfile.objects.filter(pk=profile_id, avatar=name).update(avatar=clean_name, avatar_version=version)
+    if not updated:
+        return
+    # Thumbnail URLs on the pages showing the member, which update() does not signal
+    fragments.bump_version(fragments.MEMBERS)
+    if clean_name != name:
+        default_storage.delete(name)
+    # Previous versions, now that nothing points at them
+    avatars.prune(profile.user_id, keep=version)
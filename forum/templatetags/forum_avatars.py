@@ -0,0 +1,29 @@
+"""
+Template tags for avatar thumbnails.
+
+Usage::
+
+    {% load forum_avatars %}
+    {% avatar post.author.profile 48 %}
+"""
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(profile, size=48, css_class='rounded-full'):
+    """``<picture>`` with WebP and JPEG thumbnails, the browser picking the width."""
+    img = format_html(
+        '<img src="{}" width="{}" height="{}" alt="" class="{}" loading="lazy" decoding="async">',
+        profile.get_avatar_url(size), size, size, css_class,
+    )
+    srcset = profile.get_avatar_srcset('webp')
+    if not srcset:
+        return img
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">'
+        '<source type="image/jpeg" srcset="{}" sizes="{}px">{}</picture>',
+        srcset, size, profile.get_avatar_srcset('jpeg'), size, img,
+    )
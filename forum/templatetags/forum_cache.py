@@ -0,0 +1,19 @@
+"""
+Template tags for versioned fragment caching.
+
+Usage::
+
+    {% load cache forum_cache %}
+    {% cache_version forum as version %}
+    {% cache 300 forum_row forum.pk version %}...{% endcache %}
+"""
+from django import template
+from forum.fragments import get_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def cache_version(obj=None):
+    """Current fragment version of a category or forum (of the whole tree without argument)."""
+    return get_version(obj)
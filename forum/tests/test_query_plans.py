@@ -0,0 +1,107 @@
+"""
+Query plan checks: the queries the views actually run must use an index
+on every table that grows with the forum.
+
+Each view is requested through the test client with the queries
+captured, then every captured SELECT goes through EXPLAIN QUERY PLAN.
+The pages the tree has no template for render stand-ins from
+``templates/`` next to this file.
+"""
+import re
+from pathlib import Path
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Category, Forum, Post, Topic
+
+# Tables that grow with the forum; categories and forums are small by design
+LARGE_TABLES = {Topic._meta.db_table, Post._meta.db_table, User._meta.db_table}
+
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)')
+
+TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'DIRS': [Path(__file__).resolve().parent / 'templates', *settings.TEMPLATES[0]['DIRS']],
+}]
+
+
+def full_scans(sql):
+    """Large tables that ``sql`` reads without an index, per SQLite's planner."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = '\n'.join(row[-1] for row in cursor.fetchall())
+    return sorted(set(FULL_SCAN.findall(plan)) & LARGE_TABLES), plan
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite's")
+@override_settings(
+    FORUM_POSTS_PER_PAGE=5,
+    TEMPLATES=TEMPLATES,
+    # Views written through, not by a thread outside the test transaction
+    FORUM_VIEW_FLUSH_INTERVAL=0,
+    # The manifest only exists after collectstatic
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        category = Category.objects.create(name='Général')
+        cls.forum = Forum.objects.create(category=category, name='Discussions')
+        for i in range(25):
+            topic = Topic.objects.create(forum=cls.forum, title=f'Sujet {i}', author=cls.user)
+        cls.topic = topic
+        for i in range(12):
+            Post.objects.create(topic=topic, author=cls.user, content=f'Message {i}')
+
+    def setUp(self):
+        # Page and fragment caches would hide the queries
+        cache.clear()
+
+    def assertIndexed(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        for query in captured.captured_queries:
+            if not query['sql'].lstrip().upper().startswith('SELECT'):
+                continue
+            scans, plan = full_scans(query['sql'])
+            self.assertFalse(scans, f"{url}: full scan of {', '.join(scans)}\n{query['sql']}\n{plan}")
+        return response
+
+    def urls(self):
+        forum_url = reverse('forum:forum_detail', kwargs={
+            'category_slug': self.forum.category.slug, 'forum_slug': self.forum.slug,
+        })
+        topic_url = self.topic.get_absolute_url()
+        topics = self.assertIndexed(forum_url).context['topics']
+        posts = self.assertIndexed(topic_url).context['posts']
+        return [
+            reverse('forum:index'),
+            f'{forum_url}?cursor={topics.next_cursor}',
+            f'{forum_url}?cursor=last',
+            f'{topic_url}?cursor={posts.next_cursor}',
+            f'{topic_url}?cursor=last',
+        ]
+
+    def test_anonymous(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertIndexed(url)
+
+    def test_member(self):
+        self.client.force_login(self.user)
+        profile_url = reverse('accounts:profile', kwargs={'username': self.user.username})
+        for url in [*self.urls(), profile_url]:
+            with self.subTest(url=url):
+                self.assertIndexed(url)
@@ -1,18 +1,31 @@
 """
 Forum URL configuration.
 """
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Read-only views come in an async flavour for ASGI deployments
+if settings.FORUM_ASYNC_VIEWS:
+    read_views = async_views
+else:
+    read_views = views
 
 app_name = 'forum'
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('search/', views.search, name='search'),
-    path('category/<slug:slug>/', views.category_detail, name='category_detail'),
-    path('<slug:category_slug>/<slug:forum_slug>/', views.forum_detail, name='forum_detail'),
+    path('', read_views.index, name='index'),
+    path('search/', read_views.search, name='search'),
+    path('stats/', views.stats, name='stats'),
+    path('mark-read/', views.mark_all_read, name='mark_all_read'),
+    path('topic/<int:pk>/events/', async_views.topic_events, name='topic_events'),
+    # Before the forum pattern, which would match it
+    path('post/<int:pk>/', views.find_post, name='find_post'),
+    path('category/<slug:slug>/', read_views.category_detail, name='category_detail'),
+    path('<slug:category_slug>/<slug:forum_slug>/', read_views.forum_detail, name='forum_detail'),
     path('<slug:category_slug>/<slug:forum_slug>/new/', views.create_topic, name='create_topic'),
-    path('<slug:category_slug>/<slug:forum_slug>/<slug:topic_slug>-<int:pk>/', views.topic_detail, name='topic_detail'),
+    path('<slug:category_slug>/<slug:forum_slug>/mark-read/', views.mark_forum_read, name='mark_forum_read'),
+    path('<slug:category_slug>/<slug:forum_slug>/<slug:topic_slug>-<int:pk>/', read_views.topic_detail, name='topic_detail'),
     path('<slug:category_slug>/<slug:forum_slug>/<slug:topic_slug>-<int:pk>/reply/', views.create_post, name='create_post'),
     path('post/<int:pk>/edit/', views.edit_post, name='edit_post'),
     path('post/<int:pk>/delete/', views.delete_post, name='delete_post'),
@@ -1,42 +1,104 @@
 """
 Forum views following Django MVC pattern.
 """
+import time
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
 from django.contrib import messages
-from django.db.models import Count, Max, Q
+from django.db import transaction
+from django.db.models import Prefetch
 from django.core.paginator import Paginator
+from django.urls import reverse
 from django.utils import timezone
-from .models import Category, Forum, Topic, Post
+from . import fragments, metrics, permalinks, reading, routing
+from .counters import view_counter
+from .decorators import anonymous_page_cache
+from .models import Category, Forum, Topic, Post, SiteStats
+from .pagination import KeysetPaginator, TOPIC_ORDERING, POST_ORDERING
+from .search import get_search_backend
 from .forms import TopicForm, PostForm
 
 
+def _index_state(request):
+    return fragments.get_version(), fragments.get_version(SiteStats(pk=1))
+
+
+def _category_state(request, slug):
+    return fragments.get_version()
+
+
+def _page_version(obj):
+    """Version of ``obj`` and of the category/forum names and members shown around it."""
+    return tuple(fragments.get_version(key) for key in (fragments.STRUCTURE, fragments.MEMBERS, obj))
+
+
+def _forum_state(request, category_slug, forum_slug):
+    forum_id = routing.forum_id(category_slug, forum_slug)
+    if forum_id is None or not Forum.objects.filter(pk=forum_id).exists():
+        return None
+    return _page_version(Forum(pk=forum_id))
+
+
+def _topic_state(request, category_slug, forum_slug, topic_slug, pk):
+    if not Topic.objects.filter(pk=pk, slug=topic_slug).exists():
+        return None
+    return _page_version(Topic(pk=pk))
+
+
+def _record_view(request, category_slug, forum_slug, topic_slug, pk):
+    view_counter.incr(pk)
+
+
+def _live_topic_url(topic_id, posts):
+    """Events stream of the new posts, on the last page of a topic only."""
+    if posts.has_next() or not len(posts):
+        return None
+    url = reverse('forum:topic_events', kwargs={'pk': topic_id})
+    return f'{url}?after={posts[len(posts) - 1].pk}'
+
+
+def _get_forum_or_404(category_slug, forum_slug):
+    """Forum by slugs, found through the routing cache: a primary key lookup, no join."""
+    forum_id = routing.forum_id(category_slug, forum_slug)
+    if forum_id is None:
+        raise Http404
+    return get_object_or_404(Forum.objects.select_related('category'), pk=forum_id)
+
+
+@anonymous_page_cache(_index_state)
 def index(request):
     """Homepage showing all categories and forums."""
-    categories = Category.objects.prefetch_related('forums').all()
-
-    # Get forum statistics
-    stats = {
-        'total_topics': Topic.objects.count(),
-        'total_posts': Post.objects.count(),
-        'total_users': User.objects.count(),
-        'latest_member': User.objects.order_by('-date_joined').first(),
-    }
+    forums = Forum.objects.select_related(
+        'category', 'last_post__author', 'last_post__topic__forum__category'
+    )
+    categories = Category.objects.prefetch_related(Prefetch('forums', queryset=forums)).all()
+
+    # Forum statistics, maintained by signals
+    stats = SiteStats.get()
 
     context = {
         'categories': categories,
         'stats': stats,
+        'fragment_timeout': settings.FORUM_FRAGMENT_CACHE_TIMEOUT,
+        # Per member, so kept out of the cached fragments
+        'unread_counts': reading.unread_counts(request.user),
     }
     return render(request, 'forum/index.html', context)
 
 
+def stats(request):
+    """Forum statistics as JSON, for monitoring."""
+    return JsonResponse(SiteStats.get().as_dict())
+
+
+@anonymous_page_cache(_category_state)
 def category_detail(request, slug):
     """Show all forums in a category."""
     category = get_object_or_404(Category, slug=slug)
-    forums = category.forums.annotate(
-        topic_count=Count('topics'),
-        post_count=Count('topics__posts')
-    ).all()
+    forums = category.forums.select_related('last_post__author', 'last_post__topic').all()
 
     context = {
         'category': category,
@@ -45,22 +107,21 @@ def category_detail(request, slug):
     return render(request, 'forum/category_detail.html', context)
 
 
+@anonymous_page_cache(_forum_state)
 def forum_detail(request, category_slug, forum_slug):
     """Show all topics in a forum."""
-    forum = get_object_or_404(
-        Forum.objects.select_related('category'),
-        category__slug=category_slug,
-        slug=forum_slug
-    )
+    forum = _get_forum_or_404(category_slug, forum_slug)
 
-    topics_list = forum.topics.select_related('author', 'forum').annotate(
-        post_count=Count('posts')
-    ).all()
+    topics_list = forum.topics.select_related('author', 'forum', 'last_post__author').all()
 
-    # Pagination
-    paginator = Paginator(topics_list, 20)
-    page_number = request.GET.get('page')
-    topics = paginator.get_page(page_number)
+    # Pagination: keyset cursors, page numbers kept for old links
+    if 'page' in request.GET:
+        topics = Paginator(topics_list, 20).get_page(request.GET.get('page'))
+    else:
+        paginator = KeysetPaginator(topics_list, 20, TOPIC_ORDERING)
+        topics = paginator.get_page(request.GET.get('cursor'))
+    view_counter.apply(topics)
+    reading.annotate_unread(request.user, forum.pk, topics)
 
     context = {
         'forum': forum,
@@ -69,6 +130,7 @@ def forum_detail(request, category_slug, forum_slug):
     return render(request, 'forum/forum_detail.html', context)
 
 
+@anonymous_page_cache(_topic_state, on_hit=_record_view)
 def topic_detail(request, category_slug, forum_slug, topic_slug, pk):
     """Show all posts in a topic."""
     topic = get_object_or_404(
@@ -77,15 +139,18 @@ def topic_detail(request, category_slug, forum_slug, topic_slug, pk):
         slug=topic_slug
     )
 
-    # Increment view count
+    # Increment view count (buffered, flushed in the background)
     topic.increment_views()
+    reading.mark_topic_read(request.user, topic)
 
     posts_list = topic.posts.select_related('author', 'author__profile').all()
 
-    # Pagination
-    paginator = Paginator(posts_list, 15)
-    page_number = request.GET.get('page')
-    posts = paginator.get_page(page_number)
+    # Pagination: keyset cursors, page numbers kept for old links
+    if 'page' in request.GET:
+        posts = Paginator(posts_list, settings.FORUM_POSTS_PER_PAGE).get_page(request.GET.get('page'))
+    else:
+        paginator = KeysetPaginator(posts_list, settings.FORUM_POSTS_PER_PAGE, POST_ORDERING)
+        posts = paginator.get_page(request.GET.get('cursor'))
 
     # Reply form
     form = PostForm() if request.user.is_authenticated else None
@@ -94,18 +159,34 @@ def topic_detail(request, category_slug, forum_slug, topic_slug, pk):
         'topic': topic,
         'posts': posts,
         'form': form,
+        'live_topic_url': _live_topic_url(topic.pk, posts),
     }
     return render(request, 'forum/topic_detail.html', context)
 
 
+@login_required
+def mark_forum_read(request, category_slug, forum_slug):
+    """Mark every topic of a forum as read."""
+    forum = _get_forum_or_404(category_slug, forum_slug)
+    if request.method == 'POST':
+        reading.mark_forum_read(request.user, [forum.pk])
+        messages.success(request, "Tous les sujets du forum sont marqués comme lus.")
+    return redirect(forum.get_absolute_url())
+
+
+@login_required
+def mark_all_read(request):
+    """Mark every topic of every forum as read."""
+    if request.method == 'POST':
+        reading.mark_forum_read(request.user, list(routing.get_snapshot().slugs))
+        messages.success(request, "Tous les sujets sont marqués comme lus.")
+    return redirect('forum:index')
+
+
 @login_required
 def create_topic(request, category_slug, forum_slug):
     """Create a new topic in a forum."""
-    forum = get_object_or_404(
-        Forum.objects.select_related('category'),
-        category__slug=category_slug,
-        slug=forum_slug
-    )
+    forum = _get_forum_or_404(category_slug, forum_slug)
 
     if forum.is_locked:
         messages.error(request, "Ce forum est verrouillé.")
@@ -116,21 +197,18 @@ def create_topic(request, category_slug, forum_slug):
         post_form = PostForm(request.POST)
 
         if topic_form.is_valid() and post_form.is_valid():
-            # Create topic
-            topic = topic_form.save(commit=False)
-            topic.forum = forum
-            topic.author = request.user
-            topic.save()
-
-            # Create first post
-            post = post_form.save(commit=False)
-            post.topic = topic
-            post.author = request.user
-            post.save()
-
-            # Update user profile post count
-            if hasattr(request.user, 'profile'):
-                request.user.profile.update_post_count()
+            with transaction.atomic():
+                # Create topic
+                topic = topic_form.save(commit=False)
+                topic.forum = forum
+                topic.author = request.user
+                topic.save()
+
+                # Create first post, rendered in the background
+                post = post_form.save(commit=False)
+                post.topic = topic
+                post.author = request.user
+                post.save(render=False)
 
             messages.success(request, "Votre sujet a été créé avec succès!")
             return redirect(topic.get_absolute_url())
@@ -158,24 +236,29 @@ def create_post(request, category_slug, forum_slug, topic_slug, pk):
     if request.method == 'POST':
         form = PostForm(request.POST)
         if form.is_valid():
-            post = form.save(commit=False)
-            post.topic = topic
-            post.author = request.user
-            post.save()
-
-            # Update topic's updated_at
-            topic.save(update_fields=['updated_at'])
+            with transaction.atomic():
+                post = form.save(commit=False)
+                post.topic = topic
+                post.author = request.user
+                post.save(render=False)
 
-            # Update user profile post count
-            if hasattr(request.user, 'profile'):
-                request.user.profile.update_post_count()
+                # Update topic's updated_at
+                topic.save(update_fields=['updated_at'])
 
             messages.success(request, "Votre réponse a été ajoutée!")
-            return redirect(post.get_absolute_url())
+            return redirect(permalinks.post_url(post.pk))
     else:
         return redirect(topic.get_absolute_url())
 
 
+def find_post(request, pk):
+    """Redirect to the topic page showing a post."""
+    url = permalinks.post_url(pk)
+    if url is None:
+        raise Http404
+    return redirect(url)
+
+
 @login_required
 def edit_post(request, pk):
     """Edit a post."""
@@ -191,10 +274,10 @@ def edit_post(request, pk):
             post = form.save(commit=False)
             post.is_edited = True
             post.edited_at = timezone.now()
-            post.save()
+            post.save(render=False)
 
             messages.success(request, "Votre message a été modifié!")
-            return redirect(post.get_absolute_url())
+            return redirect(permalinks.post_url(post.pk))
     else:
         form = PostForm(instance=post)
 
@@ -223,10 +306,6 @@ def delete_post(request, pk):
         topic_url = post.topic.get_absolute_url()
         post.delete()
 
-        # Update user profile post count
-        if hasattr(request.user, 'profile'):
-            request.user.profile.update_post_count()
-
         messages.success(request, "Votre message a été supprimé!")
         return redirect(topic_url)
 
@@ -236,15 +315,16 @@ def delete_post(request, pk):
 
 def search(request):
     """Search topics and posts."""
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
     results = []
 
     if query:
-        topics = Topic.objects.filter(
-            Q(title__icontains=query) | Q(posts__content__icontains=query)
-        ).distinct().select_related('forum', 'author')[:50]
-
-        results = topics
+        # Ranked by relevance, each topic carries a highlighted ``search_snippet``
+        start = time.perf_counter()
+        paginator = Paginator(get_search_backend().search(query), 20)
+        results = paginator.get_page(request.GET.get('page'))
+        results.object_list = list(results.object_list)
+        metrics.search_duration.observe(time.perf_counter() - start)
 
     context = {
         'query': query,
@@ -252,6 +332,3 @@ def search(request):
     }
     return render(request, 'forum/search.html', context)
 
-
-# Import User model
-from django.contrib.auth.models import User
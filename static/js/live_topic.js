@@ -0,0 +1,20 @@
+// Appends posts pushed by the topic's server-sent events stream after the
+// last post of the page. The script tag carries
+// data-live-topic="<events url>?after=<last post id>", set by topic_detail
+// on the last page of a topic only. EventSource reconnects by itself and
+// sends Last-Event-ID, so missed posts are replayed.
+(() => {
+    const url = document.currentScript.dataset.liveTopic;
+    let last = [...document.querySelectorAll('article[id^="post-"]')].pop();
+    if (!url || !last) {
+        return;
+    }
+    const source = new EventSource(url);
+    source.addEventListener('post', (event) => {
+        if (document.getElementById('post-' + event.lastEventId)) {
+            return;
+        }
+        last.insertAdjacentHTML('afterend', event.data);
+        last = last.nextElementSibling;
+    });
+})();
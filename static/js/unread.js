@@ -0,0 +1,10 @@
+// Fills the unread badges of the forum rows, which are cached fragments
+// shared by every member, from the counts in #unread-counts.
+const unreadCounts = JSON.parse(document.getElementById('unread-counts')?.textContent || '{}');
+document.querySelectorAll('[data-unread-forum]').forEach((badge) => {
+    const count = unreadCounts[badge.dataset.unreadForum];
+    if (count) {
+        badge.textContent = count;
+        badge.classList.remove('hidden');
+    }
+});